@@ -3,5 +3,7 @@ from .temporal import resolve_temporal
 from .risk import detect_risks
 from .omissions import analyze_omissions
 from .summarize import generate_hinglish_summary
+from .knowledge_base import warmup
+from .llm import warmup_llm
 
-__all__ = ["extract_entities", "resolve_temporal", "detect_risks", "analyze_omissions", "generate_hinglish_summary"]
+__all__ = ["extract_entities", "resolve_temporal", "detect_risks", "analyze_omissions", "generate_hinglish_summary", "warmup", "warmup_llm"]
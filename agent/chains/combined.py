@@ -0,0 +1,173 @@
+import asyncio
+import functools
+import logging
+import os
+from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from models import CombinedAnalysis, OmissionAnalysis, RiskAssessment
+from chains.llm import get_llm, with_prompt_cache, invoke_structured, to_prompt_json
+from chains.risk import _compute_overall_risk, detect_risks
+from chains.omissions import _count_high_severity, analyze_omissions
+
+logger = logging.getLogger("agent.chains.combined")
+
+# Layers 3+4 in one call: one RTT/TTFT instead of two, one shared RAG context.
+# Off by default — the split layers stay the reference behaviour.
+COMBINED_LAYERS_ENABLED = os.environ.get("PG_COMBINED_LAYERS", "0") == "1"
+
+_DOC_SEPARATOR = "\n\n---\n\n"
+
+combined_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content="""You are a clinical safety reviewer for nurse handoffs.
+Perform TWO independent analyses and return both in ONE JSON object.
+
+Use the RETRIEVED CLINICAL KNOWLEDGE in the user message as your primary reference.
+
+━━━ SECTION A — RISK ASSESSMENT ━━━
+Analyze ONLY for DANGEROUS combinations that REQUIRE immediate nurse action.
+
+CRITERIA FOR EMPTY ALERTS (stable case):
+- All vitals normal: BP 100-140/60-90, HR 60-100, RR 12-20, Temp 98-99
+- No new medications, dose changes, or symptoms
+- No abnormal trends or pending critical labs
+
+SCORING (MUST FOLLOW):
+- CRITICAL = 100, HIGH = 75, MEDIUM = 50, LOW = 25, NO_ALERTS = 0
+- overall_risk = highest severity alert (LOW if empty)
+
+━━━ SECTION B — WHAT WAS NOT SAID ━━━
+Detect CRITICAL MISSING INFORMATION — what SHOULD have been mentioned but wasn't.
+
+MEDICATION FREQUENCY CHECK (always run this first):
+Any entry in Temporal Calculated Times whose value contains "inferred — not stated in transcript"
+means the nurse did NOT mention the dosing frequency for that drug. For each such entry add:
+  type: "<DrugName>_frequency_not_stated"
+  severity: "MEDIUM"
+  reason: "Nurse did not specify dosing frequency for <DrugName>. Frequency was inferred from pharmacology, not confirmed in handoff."
+  expected_in_handoff: "State frequency explicitly, e.g. '<DrugName> OD' or '<DrugName> BD'"
+
+NEGATIVE REASONING — detect ABSENCE of expected care elements:
+- For any drug: was monitoring/level/assessment mentioned?
+- For any condition: were relevant vitals and assessment mentioned?
+- For any symptom: was follow-up or reassessment mentioned?
+- For any risk you identified in Section A: were appropriate precautions documented?
+
+Return ONLY valid JSON matching this EXACT schema:
+
+{
+  "risk_assessment": {
+    "alerts": [
+      {
+        "severity": "CRITICAL or HIGH or MEDIUM or LOW",
+        "alert_type": "short_category",
+        "reason": "string",
+        "action_required": "string",
+        "confidence": 0.8
+      }
+    ],
+    "overall_risk": "CRITICAL" or "HIGH" or "MEDIUM" or "LOW",
+    "risk_score": 100 or 75 or 50 or 25 or 0
+  },
+  "omission_analysis": {
+    "omissions": [
+      {
+        "type": "short_category e.g. glucose_monitoring",
+        "severity": "HIGH or MEDIUM or LOW",
+        "reason": "Why this omission is clinically dangerous",
+        "expected_in_handoff": "What specifically should have been said"
+      }
+    ],
+    "high_risk_conditions_mentioned": ["condition name"],
+    "missing_critical_items": ["item description"]
+  }
+}
+
+Rules:
+- Use EXACTLY these field names; both top-level keys are always present
+- alerts is EMPTY if there are no dangerous patterns; omissions is EMPTY if nothing critical is missing
+- Output ONLY the JSON object, no explanation"""),
+    ("human", """RETRIEVED CLINICAL KNOWLEDGE:
+{rag_context}
+
+Transcript: {transcript}
+Extracted Patient Data: {extracted}
+Temporal Information: {temporal}
+Temporal Calculated Times: {temporal_calculated_times}
+Previous Shift Context: {context}
+Handoff Time: {handoff_time}
+
+JSON only:""")
+])
+
+
+@functools.lru_cache(maxsize=None)
+def _combined_chain():
+    return combined_prompt | with_prompt_cache(get_llm(), "combined") | StrOutputParser()  # raw text — parsed by invoke_structured
+
+
+def merge_rag_contexts(*contexts: str) -> str:
+    """Join the retrieved doc strings, dropping documents that appear more than once."""
+    docs = dict.fromkeys(
+        doc for ctx in contexts if ctx for doc in ctx.split(_DOC_SEPARATOR) if doc
+    )
+    return _DOC_SEPARATOR.join(docs)
+
+
+async def analyze_risks_and_omissions(
+    transcript: str,
+    extracted: dict,
+    temporal: dict,
+    handoff_time: str = "07:00",
+    context: str = "",
+    temporal_calculated_times: dict | None = None,
+    risk_context: str = "",
+    omission_context: str = "",
+) -> tuple[RiskAssessment, OmissionAnalysis]:
+    """
+    Layers 3+4 in a single structured call. Falls back to the two separate
+    layers if the combined response can't be obtained or parsed.
+    """
+    rag_context = merge_rag_contexts(risk_context, omission_context)
+    calculated_times = temporal_calculated_times or {}
+    logger.info(
+        "Combined risk+omission | time=%s | kb_docs=%d",
+        handoff_time,
+        rag_context.count(_DOC_SEPARATOR) + 1 if rag_context else 0,
+    )
+
+    try:
+        result = await invoke_structured(_combined_chain(), {
+            "transcript": transcript,
+            "extracted": to_prompt_json(extracted),
+            "temporal": to_prompt_json(temporal),
+            "temporal_calculated_times": to_prompt_json(calculated_times),
+            "context": context,
+            "handoff_time": handoff_time,
+            "rag_context": rag_context or "No clinical knowledge retrieved. Use general nursing handoff standards.",
+        }, CombinedAnalysis)
+    except Exception as e:
+        logger.error("Combined layers failed, falling back to separate calls: %s", e)
+        return await asyncio.gather(
+            detect_risks(extracted, temporal, handoff_time, rag_context=risk_context),
+            analyze_omissions(
+                transcript,
+                extracted,
+                {},
+                context=context,
+                temporal_calculated_times=calculated_times,
+                rag_context=omission_context,
+            ),
+        )
+
+    risks, omissions = result.risk_assessment, result.omission_analysis
+    _compute_overall_risk(risks)
+    logger.info(
+        "Combined complete | alerts=%d | risk=%s | score=%d | omissions=%d high=%d",
+        len(risks.alerts),
+        risks.overall_risk,
+        risks.risk_score,
+        len(omissions.omissions),
+        _count_high_severity(omissions.omissions),
+    )
+    return risks, omissions
@@ -1,46 +1,49 @@
+import functools
 import logging
+from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from models import ExtractedData, HandoffSummary
-from chains.llm import llm, invoke_structured
+from chains.llm import get_llm, with_prompt_cache, invoke_structured
 
 logger = logging.getLogger("agent.chains.extract")
 
 extract_prompt = ChatPromptTemplate.from_messages([
-    ("system", """You are a clinical entity extraction system for nurse handoffs.
+    SystemMessage(content="""You are a clinical entity extraction system for nurse handoffs.
 Extract structured information and return ONLY valid JSON matching this EXACT schema:
 
-{{
-  "summary": {{
+{
+  "summary": {
     "patient_name": "string",
     "bed": "string",
     "age": null,
     "chief_complaint": "string or null"
-  }},
+  },
   "medications": [
-    {{
+    {
       "name": "string",
       "dose": "string",
       "time_given": "exact phrase from transcript e.g. subah, 4 hours ago, or unknown",
       "reason": "string or null"
-    }}
+    }
   ],
   "vitals": [
-    {{
+    {
       "type": "BP or HR or Temp or SpO2 or RR",
       "value": "current value as string e.g. 90 or 140/90",
       "systolic": null,
       "diastolic": null,
       "trend": "stable or rising or dropping or unknown"
-    }}
+    }
   ],
   "symptoms": [
-    {{
+    {
       "description": "string",
       "severity": "mild or moderate or severe"
-    }}
+    }
   ],
   "pending_tasks": ["string"]
-}}
+}
 
 Rules:
 - Use EXACTLY these field names — do not rename them
@@ -67,7 +70,10 @@ TREND DETECTION:
 Return ONLY the JSON:""")
 ])
 
-extract_chain = extract_prompt | llm  # raw output — parsed by invoke_structured
+
+@functools.lru_cache(maxsize=None)
+def _extract_chain():
+    return extract_prompt | with_prompt_cache(get_llm(), "extract") | StrOutputParser()  # raw text — parsed by invoke_structured
 
 
 async def extract_entities(transcript: str) -> ExtractedData:
@@ -77,7 +83,7 @@ async def extract_entities(transcript: str) -> ExtractedData:
     """
     logger.info("Invoking LLM for entity extraction | transcript_len=%d", len(transcript))
     try:
-        result = await invoke_structured(extract_chain, {"transcript": transcript}, ExtractedData)
+        result = await invoke_structured(_extract_chain(), {"transcript": transcript}, ExtractedData)
         logger.info(
             "Extraction complete | meds=%d vitals=%d symptoms=%d tasks=%d",
             len(result.medications),
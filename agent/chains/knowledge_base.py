@@ -1,62 +1,220 @@
 
+import asyncio
 import logging
-import chromadb
-from chromadb import Settings as ChromaSettings
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+import re
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
 from pathlib import Path
 
 logger = logging.getLogger("agent.knowledge_base")
 
 CHROMA_PATH = str(Path(__file__).parent.parent / "chroma_db")
 COLLECTION_NAME = "clinical_knowledge"
-EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"   # served by Chroma's bundled ONNX build
+
+# Retrieval cache — handoffs repeat the same meds/complaints, so a repeated query
+# reuses the previous retrieval instead of hitting Chroma again. Keyed on the
+# normalised query text, never on embedding similarity: the queries are bags of
+# drug/symptom tokens, and swapping one drug (heparin → warfarin) barely moves a
+# MiniLM embedding while changing which clinical context is relevant.
+CACHE_MAX_SIZE = 512
+CACHE_TTL_SECONDS = 600.0
+
+_WS_RE = re.compile(r"\s+")
 
 # Lazy-loaded singletons (no inline type hints — chromadb.PersistentClient
 # is a factory function in chromadb>=0.5, so X|None raises TypeError at runtime)
 _client = None
 _collection = None
+_embedding_fn = None
+_collection_count = None   # cached — every .count() is a SQLite round-trip
+
+
+class _QueryCache:
+    """
+    TTL + LRU cache of joined KB docs keyed on (normalised query, n_results).
+
+    Lookups run in worker threads (asyncio.to_thread), hence the lock.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple[str, int], tuple[float, str]]" = OrderedDict()
+
+    @staticmethod
+    def _key(query: str, n_results: int) -> tuple[str, int]:
+        return _WS_RE.sub(" ", query).strip().casefold(), n_results
+
+    def get(self, query: str, n_results: int) -> str | None:
+        key = self._key(query, n_results)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self._ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, query: str, n_results: int, value: str) -> None:
+        key = self._key(query, n_results)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = _QueryCache(CACHE_MAX_SIZE, CACHE_TTL_SECONDS)
 
 
 def _get_collection():
     """Initialise ChromaDB client and collection on first call."""
-    global _client, _collection
+    global _client, _collection, _embedding_fn, _collection_count
     if _collection is None:
+        # Imported here — chromadb pulls in onnxruntime, which paths that never
+        # touch the KB shouldn't pay for at startup
+        import chromadb
+        from chromadb import Settings as ChromaSettings
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
         _client = chromadb.PersistentClient(
             path=CHROMA_PATH,
             settings=ChromaSettings(anonymized_telemetry=False),
         )
-        embedding_fn = SentenceTransformerEmbeddingFunction(
-            model_name=EMBEDDING_MODEL
-        )
+        # Same all-MiniLM-L6-v2 weights as sentence-transformers (unit-normalised
+        # output, so existing vectors stay comparable) but on onnxruntime — no
+        # torch in memory and several times faster per query on CPU
+        _embedding_fn = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+        # Opened without an embedding function: every query passes query_embeddings
+        # from _embed, and a collection created by the original
+        # SentenceTransformerEmbeddingFunction persisted that function's name, so
+        # handing Chroma a different one raises an embedding-function conflict.
+        # Cosine matches the unit-normalised MiniLM vectors; only applied when
+        # the collection is first created
         _collection = _client.get_or_create_collection(
             name=COLLECTION_NAME,
-            embedding_function=embedding_fn,
+            embedding_function=None,
+            metadata={"hnsw:space": "cosine"},
         )
-        count = _collection.count()
-        if count == 0:
+        _collection_count = _collection.count()
+        if _collection_count == 0:
             logger.warning("Knowledge base is EMPTY — run chains/ingest.py to populate")
         else:
-            logger.info("Knowledge base ready | documents=%d", count)
+            logger.info("Knowledge base ready | documents=%d", _collection_count)
     return _collection
 
 
+def _get_count() -> int:
+    global _collection_count
+    collection = _get_collection()
+    if _collection_count is None:
+        _collection_count = collection.count()
+    return _collection_count
+
+
+def invalidate_count() -> None:
+    """Drop the cached document count and retrievals — call after ingesting into the collection."""
+    global _collection_count
+    _collection_count = None
+    _cache.clear()
+
+
+def _embed(texts: list[str]) -> np.ndarray:
+    """Raw MiniLM embeddings, one row per text."""
+    return np.asarray(_embedding_fn(texts), dtype=np.float32)
+
+
 def query_clinical_knowledge(query: str, n_results: int = 3) -> str:
-    if not query.strip():
-        return ""
+    return batch_query_clinical_knowledge([query], n_results)[0]
+
+
+def batch_query_clinical_knowledge(queries: list[str], n_results: int = 3) -> list[str]:
+    """
+    Retrieve KB context for several queries at once.
+
+    Cache misses are embedded in one batched ONNXMiniLM_L6_V2 call and sent
+    to Chroma as a single multi-query call. Returns one joined
+    doc string per query ("" when nothing was retrieved).
+    """
+    results_out = [""] * len(queries)
+    live = [i for i, q in enumerate(queries) if q.strip()]
+    if not live:
+        return results_out
 
     collection = _get_collection()
-    if collection.count() == 0:
-        return ""
+    count = _get_count()
+    if count == 0:
+        return results_out
+
+    misses: list[int] = []
+    for i in live:
+        cached = _cache.get(queries[i], n_results)
+        if cached is None:
+            misses.append(i)
+        else:
+            logger.debug("KB cache hit | query='%.60s'", queries[i])
+            results_out[i] = cached
+    if not misses:
+        return results_out
 
+    # Only the misses are embedded — one batched call for all of them
     results = collection.query(
-        query_texts=[query],
-        n_results=min(n_results, collection.count()),
+        query_embeddings=_embed([queries[i] for i in misses]).tolist(),
+        n_results=min(n_results, count),
     )
 
-    docs: list[str] = results.get("documents", [[]])[0]
-    if not docs:
-        logger.debug("KB query returned no results for: %s", query[:80])
-        return ""
+    for i, docs in zip(misses, results.get("documents") or [[]] * len(misses)):
+        query = queries[i]
+        if not docs:
+            logger.debug("KB query returned no results for: %s", query[:80])
+            continue
+        logger.debug("KB query='%.60s' | retrieved=%d docs", query, len(docs))
+        joined = "\n\n---\n\n".join(docs)
+        _cache.put(query, n_results, joined)
+        results_out[i] = joined
+    return results_out
+
+
+async def aquery_clinical_knowledge(query: str, n_results: int = 3) -> str:
+    """Async wrapper — runs the blocking embed + Chroma query in a worker thread
+    so it can overlap in-flight LLM calls instead of stalling the event loop."""
+    return await asyncio.to_thread(query_clinical_knowledge, query, n_results)
+
+
+async def abatch_query_clinical_knowledge(queries: list[str], n_results: int = 3) -> list[str]:
+    """Async wrapper around batch_query_clinical_knowledge (worker thread)."""
+    return await asyncio.to_thread(batch_query_clinical_knowledge, queries, n_results)
+
+
+def _warmup() -> None:
+    collection = _get_collection()
+    # First embed call loads the ONNX session + tokenizer; first query pages in the HNSW index
+    embedding = _embedding_fn(["warmup"])
+    if _get_count():
+        collection.query(query_embeddings=[list(embedding[0])], n_results=1)
+
 
-    logger.debug("KB query='%.60s' | retrieved=%d docs", query, len(docs))
-    return "\n\n---\n\n".join(docs)
+async def warmup() -> None:
+    """
+    Load the embedding model and Chroma index at startup so the first handoff
+    doesn't pay for them. Failures are logged, never raised — the lazy path
+    still works on the first real request.
+    """
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(_warmup)
+    except Exception as e:
+        logger.warning("KB warmup failed: %s", e)
+        return
+    logger.info("KB warmup complete | ms=%d", (time.perf_counter() - start) * 1000)
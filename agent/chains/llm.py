@@ -1,50 +1,149 @@
+import asyncio
+import functools
+import importlib.util
 import json
 import logging
 import os
 import re
+import sys
 from typing import Any, Type, TypeVar
 
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+import httpx
+import orjson
 from pydantic import BaseModel
 from tenacity import (
     after_log,
     before_log,
     retry,
-    retry_if_exception_type,
+    retry_if_exception,
     stop_after_attempt,
-    wait_fixed,
+    wait_random_exponential,
 )
 
 logger = logging.getLogger("agent.llm")
 
 T = TypeVar("T", bound=BaseModel)
 
+_THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+_ANSWER_RE = re.compile(r"</?[Aa]nswer>")
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+_JSON_TOKEN_RE = re.compile(r'[{}"\\]')  # only characters that affect brace depth
+
 # ---------------------------------------------------------------------------
 # Backend configuration
 # Switch between MegaLLM cloud (primary) and local mlx_lm.server (fallback)
 # ---------------------------------------------------------------------------
 
+# Clients are built on first use — importing langchain_openai costs ~1s, and
+# `from chains.llm import llm` keeps working through the module __getattr__.
+
+@functools.lru_cache(maxsize=None)
+def _http_async_client() -> httpx.AsyncClient:
+    """
+    One pooled client for every LLM call — parallel layers and retries reuse
+    warm TCP+TLS connections instead of each ChatOpenAI opening its own.
+    HTTP/2 (multiplexing the parallel layer calls) needs the optional `h2` package.
+    """
+    return httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        timeout=httpx.Timeout(120.0, connect=5.0),
+    )
+
+
+async def aclose_http_client() -> None:
+    """Close the shared pool on shutdown (no-op if no LLM call was ever made)."""
+    if _http_async_client.cache_info().currsize:
+        await _http_async_client().aclose()
+
+
 # -- MegaLLM cloud endpoint (clinical analysis — Layers 1-4) --
-llm = ChatOpenAI(
-    base_url="https://ai.megallm.io/v1",
-    api_key=os.environ.get("MEGALLM_API_KEY", ""),
-    model="openai-gpt-oss-20b",
-    max_tokens=6000,
-    temperature=0,
-)
+@functools.lru_cache(maxsize=None)
+def get_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        base_url="https://ai.megallm.io/v1",
+        api_key=os.environ.get("MEGALLM_API_KEY", ""),
+        model="openai-gpt-oss-20b",
+        max_tokens=6000,
+        temperature=0,
+        http_async_client=_http_async_client(),
+    )
+
 
 # -- Gemini 2.5 Flash Lite (Hinglish output — Layer 5) --
 # Faster/lighter model for conversational text generation, not structured JSON
-llm_fast = ChatOpenAI(
-    base_url="https://ai.megallm.io/v1",
-    api_key=os.environ.get("MEGALLM_API_KEY", ""),
-    model="gemini-2.5-flash-lite",
-    max_tokens=2048,
-    temperature=0.3,   # slight creativity for natural Hinglish prose
-)
+@functools.lru_cache(maxsize=None)
+def get_llm_fast():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        base_url="https://ai.megallm.io/v1",
+        api_key=os.environ.get("MEGALLM_API_KEY", ""),
+        model="gemini-2.5-flash-lite",
+        max_tokens=2048,
+        temperature=0.3,   # slight creativity for natural Hinglish prose
+        http_async_client=_http_async_client(),
+    )
+
+
+def check_event_loop() -> None:
+    """
+    Warn when the running loop isn't uvloop. The pipeline is nothing but awaited
+    httpx calls, and libuv's scheduling and socket wake-ups are noticeably
+    cheaper than the stdlib selector loop. Call from inside the running loop.
+    """
+    if sys.platform == "win32":
+        return  # uvloop has no Windows build
+    loop_type = type(asyncio.get_running_loop())
+    if not loop_type.__module__.startswith("uvloop"):
+        logger.warning(
+            "Event loop is %s.%s, not uvloop — pip install uvloop",
+            loop_type.__module__,
+            loop_type.__name__,
+        )
+
+
+# Prompt caching — the layer system prompts are static, so the upstream can reuse
+# the cached prefix (OpenAI-compatible backends cache prompts >=1024 tokens
+# automatically). A per-layer prompt_cache_key routes every call of a layer to
+# the same cache shard; opt-in because not every gateway forwards the field.
+PROMPT_CACHE_ENABLED = os.environ.get("LLM_PROMPT_CACHE", "0") == "1"
+
+
+def with_prompt_cache(model: Any, layer: str) -> Any:
+    """Bind a stable prompt_cache_key for `layer` when prompt caching is enabled."""
+    if not PROMPT_CACHE_ENABLED:
+        return model
+    return model.bind(prompt_cache_key=f"pulseguard-{layer}")
+
+
+async def warmup_llm() -> None:
+    """
+    One 1-token request per client — opens the pooled connection (TCP+TLS)
+    and warms provider routing before the first handoff arrives.
+    """
+    try:
+        await asyncio.gather(
+            get_llm().bind(max_tokens=1).ainvoke("ping"),
+            get_llm_fast().bind(max_tokens=1).ainvoke("ping"),
+        )
+    except Exception as e:
+        logger.warning("LLM warmup failed: %s", e)
+
+
+def __getattr__(name: str) -> Any:
+    # PEP 562 — resolve the legacy module attributes lazily
+    if name == "llm":
+        return get_llm()
+    if name == "llm_fast":
+        return get_llm_fast()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # -- Local mlx_lm.server (commented out — use for offline / dev) --
+# Prefix caching only pays off if the server keeps the KV cache between requests;
+# on an Ollama backend run with keep_alive=-1 (OLLAMA_KEEP_ALIVE=-1) so the model
+# and its cached system-prompt prefix aren't unloaded after every call.
 # llm = ChatOpenAI(
 #     base_url="http://localhost:11434/v1",
 #     api_key="dummy",
@@ -53,73 +152,180 @@ llm_fast = ChatOpenAI(
 #     temperature=0,
 # )
 
-def _parse_reasoning_output(raw: str, model_class: Type[T]) -> T:
+
+class _JsonScanner:
     """
-    Strip <think> blocks and Answer tags, extract JSON, parse into model_class.
-    Safe for both reasoning models (with think tags) and standard models (without).
+    Incremental brace-depth scanner that finds where the first top-level
+    { ... } object ends. Braces inside JSON string literals are ignored.
+    scan() may be called repeatedly on a growing buffer (streaming); each
+    call resumes where the previous one stopped, so every character is
+    inspected once.
     """
-    # 1. Remove <think>...</think> blocks
-    text = re.sub(r"<think>.*?</think>", "", raw, flags=re.DOTALL).strip()
 
-    # 2. Strip <Answer> / </Answer> wrapper tags
-    text = re.sub(r"</?[Aa]nswer>", "", text).strip()
+    __slots__ = ("depth", "start", "in_string", "skip_to", "pos")
 
-    # 3. Extract from ```json ... ``` code fence if present
-    code_fence = re.search(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
+    def __init__(self, pos: int = 0) -> None:
+        self.depth = 0
+        self.start = -1
+        self.in_string = False
+        self.skip_to = -1
+        self.pos = pos
+
+    def scan(self, text: str) -> int:
+        """Return the index just past the closing brace, or -1 if not closed yet."""
+        for match in _JSON_TOKEN_RE.finditer(text, self.pos):
+            pos = match.start()
+            if pos < self.skip_to:
+                continue
+            ch = text[pos]
+            if self.in_string:
+                if ch == "\\":
+                    self.skip_to = pos + 2     # skip the escaped character
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = self.depth > 0
+            elif ch == "{":
+                if self.depth == 0:
+                    self.start = pos
+                self.depth += 1
+            elif ch == "}" and self.depth:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.pos = pos + 1
+                    return pos + 1
+        self.pos = len(text)
+        return -1
+
+
+def _outermost_json(text: str) -> str:
+    """
+    Return the first balanced { ... } object in text, in a single pass.
+    Anything after the object closes (trailing prose, stray tags) is dropped.
+    """
+    scanner = _JsonScanner()
+    end = scanner.scan(text)
+    if end != -1:
+        return text[scanner.start : end]
+    # Unbalanced — hand back what we have and let the JSON parser report it
+    return text[scanner.start :] if scanner.start != -1 else text
+
+
+def extract_json_text(raw: str) -> str:
+    """
+    Strip <think> blocks, Answer tags and code fences, then isolate the JSON object.
+    Safe for both reasoning models (with think tags) and standard models (without).
+    """
+    text = _THINK_RE.sub("", raw)
+    text = _ANSWER_RE.sub("", text)
+
+    code_fence = _FENCE_RE.search(text)
     if code_fence:
-        text = code_fence.group(1).strip()
+        text = code_fence.group(1)
+
+    return _outermost_json(text)
+
+
+def to_prompt_json(data: Any) -> str:
+    """Serialise layer output for a prompt — compact JSON is cheaper in tokens than a Python repr."""
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _parse_reasoning_output(raw: str, model_class: Type[T]) -> T:
+    """Extract the JSON object from raw LLM output and parse it into model_class."""
+    # orjson + model_validate beats pydantic's own JSON parser on these small payloads
+    return model_class.model_validate(orjson.loads(extract_json_text(raw)))
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Connection drops, timeouts, 429s and 5xx are worth retrying; bad output is not."""
+    import openai  # already loaded by the time an LLM call has failed
+    return isinstance(
+        exc,
+        (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError),
+    )
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_random_exponential(multiplier=0.5, max=8),
+    retry=retry_if_exception(_is_transient),
+    before=before_log(logger, logging.DEBUG),
+    after=after_log(logger, logging.WARNING),
+    reraise=True,
+)
+async def _astream_until_json(chain: Any, inputs: dict) -> str:
+    """
+    Stream the completion and stop as soon as the first top-level JSON object
+    closes — the model's epilogue (closing tags, trailing commentary) is never
+    waited for. Falls back to the full text if no object ever closes.
+    """
+    buf = ""
+    scanner = None
+    stream = chain.astream(inputs)
+    try:
+        async for chunk in stream:
+            buf += chunk
+            if scanner is None:
+                # Reasoning models may emit braces inside <think>; scan only after it.
+                # Until a brace shows up the buffer may still be (leading whitespace,
+                # an empty first delta, or a tag split like "<thi") the start of one
+                if "<think>" in buf:
+                    think_end = buf.find("</think>")
+                    if think_end == -1:
+                        continue
+                    scanner = _JsonScanner(think_end + len("</think>"))
+                elif "{" in buf:
+                    scanner = _JsonScanner()
+                else:
+                    continue
+            if scanner.scan(buf) != -1:
+                break
+        else:
+            return buf
+    except BaseException:
+        await stream.aclose()
+        raise
+    # Read the epilogue off the wire in the background rather than closing the
+    # stream mid-response — an abandoned HTTP/1.1 response takes its keep-alive
+    # connection down with it, and the next LLM call would reconnect
+    task = asyncio.create_task(_drain(stream))
+    _drain_tasks.add(task)
+    task.add_done_callback(_drain_tasks.discard)
+    return buf
+
 
-    # 4. Find the outermost JSON object { ... }
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        text = text[start : end + 1]
+_drain_tasks: "set[asyncio.Task[None]]" = set()
 
-    return model_class.model_validate_json(text)
+
+async def _drain(stream: Any) -> None:
+    try:
+        async for _ in stream:
+            pass
+    except Exception as e:   # the answer is already returned; nothing to propagate to
+        logger.debug("Draining LLM stream failed: %s", e)
+    finally:
+        await stream.aclose()
 
 
 async def invoke_structured(
-    prompt_chain: Any,
+    str_chain: Any,
     inputs: dict,
     model_class: Type[T],
 ) -> T:
     """
-    Invoke prompt | llm, parse raw output into model_class, retry up to 3x.
+    Invoke prompt | llm | StrOutputParser and parse the raw output into model_class.
+
+    The response is streamed and cut off once the JSON object is complete.
+    Only the LLM call is retried (up to 3x, on transient network/provider
+    errors). Parsing runs once on the returned text — malformed output from a
+    temperature-0 model won't improve by paying for the same call again.
 
     Usage:
-        chain = some_prompt | llm        # NO with_structured_output
+        # build once (module scope / cached factory) — NO with_structured_output
+        chain = some_prompt | llm | StrOutputParser()
         result = await invoke_structured(chain, inputs, MyModel)
     """
-    str_chain = prompt_chain | StrOutputParser()
-
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_fixed(2),
-        retry=retry_if_exception_type(Exception),
-        before=before_log(logger, logging.DEBUG),
-        after=after_log(logger, logging.WARNING),
-        reraise=True,
-    )
-    async def _attempt() -> T:
-        raw: str = await str_chain.ainvoke(inputs)
-        logger.debug("Raw LLM output (first 300 chars): %s", raw[:300])
-        return _parse_reasoning_output(raw, model_class)
-
-    return await _attempt()
-
-
-# Keep for backwards compatibility
-async def invoke_with_retry(chain: Any, inputs: dict) -> Any:
-    """Legacy helper — prefer invoke_structured for typed parsing."""
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_fixed(2),
-        retry=retry_if_exception_type(Exception),
-        before=before_log(logger, logging.DEBUG),
-        after=after_log(logger, logging.WARNING),
-        reraise=True,
-    )
-    async def _attempt() -> Any:
-        return await chain.ainvoke(inputs)
-
-    return await _attempt()
+    raw: str = await _astream_until_json(str_chain, inputs)
+    logger.debug("Raw LLM output (first 300 chars): %s", raw[:300])
+    return _parse_reasoning_output(raw, model_class)
@@ -1,17 +1,19 @@
+import functools
 import logging
+from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from models import OmissionAnalysis, RiskSeverity
-from chains.llm import llm, invoke_structured
-from chains.knowledge_base import query_clinical_knowledge
+from chains.llm import get_llm, with_prompt_cache, invoke_structured, to_prompt_json
+from chains.knowledge_base import aquery_clinical_knowledge
 
 logger = logging.getLogger("agent.chains.omissions")
 
 omission_prompt = ChatPromptTemplate.from_messages([
-    ("system", """You are a "What Was NOT Said" analyzer for nurse handoffs.
+    SystemMessage(content="""You are a "What Was NOT Said" analyzer for nurse handoffs.
 Detect CRITICAL MISSING INFORMATION by analyzing what SHOULD have been mentioned but wasn't.
 
-RETRIEVED MONITORING STANDARDS:
-{rag_context}
+Use the RETRIEVED MONITORING STANDARDS in the user message as your reference.
 
 ━━━ MEDICATION FREQUENCY CHECK (always run this first) ━━━
 You will receive a temporal_calculated_times dict from the previous pipeline step.
@@ -31,25 +33,28 @@ For each such entry, add an omission:
 
 Return ONLY valid JSON matching this EXACT schema:
 
-{{
+{
   "omissions": [
-    {{
+    {
       "type": "short_category e.g. glucose_monitoring",
       "severity": "HIGH or MEDIUM or LOW",
       "reason": "Why this omission is clinically dangerous",
       "expected_in_handoff": "What specifically should have been said"
-    }}
+    }
   ],
   "high_risk_conditions_mentioned": ["condition name"],
   "missing_critical_items": ["item description"]
-}}
+}
 
 Rules:
 - Use EXACTLY these field names
 - omissions not missing, expected_in_handoff not expected
-- If nothing critical is missing: return {{"omissions": [], "high_risk_conditions_mentioned": [], "missing_critical_items": []}}
+- If nothing critical is missing: return {"omissions": [], "high_risk_conditions_mentioned": [], "missing_critical_items": []}
 - Output ONLY the JSON object, no explanation"""),
-    ("human", """Transcript: {transcript}
+    ("human", """RETRIEVED MONITORING STANDARDS:
+{rag_context}
+
+Transcript: {transcript}
 Extracted Entities: {extracted}
 Detected Risks: {risks}
 Previous Shift Context: {context}
@@ -58,15 +63,33 @@ Temporal Calculated Times: {temporal_calculated_times}
 Return ONLY the JSON:""")
 ])
 
-omission_chain = omission_prompt | llm  # raw output — parsed by invoke_structured
 
+@functools.lru_cache(maxsize=None)
+def _omission_chain():
+    return omission_prompt | with_prompt_cache(get_llm(), "omission") | StrOutputParser()  # raw text — parsed by invoke_structured
+
+
+_SEV_HIGH = RiskSeverity.HIGH
 
-def _build_omission_query(extracted: dict) -> str:
+
+def _count_high_severity(omissions: list) -> int:
+    # validated severities are enum singletons — identity check skips Enum.__eq__
+    return sum(o.severity is _SEV_HIGH for o in omissions)
+
+
+def build_omission_query(extracted: dict) -> str:
     """Build ChromaDB query focused on conditions and medications for protocol lookup."""
-    meds = [m.get("name", "") for m in extracted.get("medications", [])]
-    chief = extracted.get("summary", {}).get("chief_complaint", "")
-    symptoms = [s.get("description", "") for s in extracted.get("symptoms", [])]
-    return " ".join(filter(None, meds + [chief] + symptoms)) + " monitoring protocol handoff requirements"
+    terms = " ".join(x for x in (
+        *(m.get("name", "") for m in extracted.get("medications", ())),
+        extracted.get("summary", {}).get("chief_complaint", ""),
+        *(s.get("description", "") for s in extracted.get("symptoms", ())),
+    ) if x)
+    return terms + " monitoring protocol handoff requirements"
+
+
+async def retrieve_omission_context(extracted: dict) -> str:
+    """KB lookup for Layer 4 — only needs Layer 1 output, so callers can start it early."""
+    return await aquery_clinical_knowledge(build_omission_query(extracted), n_results=3)
 
 
 async def analyze_omissions(
@@ -75,10 +98,11 @@ async def analyze_omissions(
     risks: dict,
     context: str = "",
     temporal_calculated_times: dict | None = None,
+    rag_context: str | None = None,
 ) -> OmissionAnalysis:
     """Layer 4: Detect what critical information was NOT mentioned in handoff."""
-    query = _build_omission_query(extracted)
-    rag_context = query_clinical_knowledge(query, n_results=3)
+    if rag_context is None:
+        rag_context = await retrieve_omission_context(extracted)
     calculated_times = temporal_calculated_times or {}
 
     inferred_count = sum(
@@ -92,16 +116,16 @@ async def analyze_omissions(
     )
 
     try:
-        result = await invoke_structured(omission_chain, {
+        result = await invoke_structured(_omission_chain(), {
             "transcript": transcript,
-            "extracted": str(extracted),
-            "risks": str(risks),
+            "extracted": to_prompt_json(extracted),
+            "risks": to_prompt_json(risks),
             "context": context,
             "rag_context": rag_context or "No specific protocols retrieved. Use general nursing handoff standards.",
-            "temporal_calculated_times": str(calculated_times),
+            "temporal_calculated_times": to_prompt_json(calculated_times),
         }, OmissionAnalysis)
 
-        high_count = sum(1 for o in result.omissions if o.severity == RiskSeverity.HIGH)
+        high_count = _count_high_severity(result.omissions)
         logger.info(
             "Omission analysis complete | total=%d high_severity=%d",
             len(result.omissions),
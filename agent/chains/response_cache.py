@@ -0,0 +1,66 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+from models import AgentOutput
+
+logger = logging.getLogger("agent.response_cache")
+
+# Whole-pipeline cache for resubmitted transcripts. Keyed on the exact transcript
+# after whitespace/case normalisation — never on embedding similarity: one word
+# ("no chest pain" vs "chest pain", heparin vs warfarin) flips the clinical
+# meaning while barely moving a sentence embedding. 0 disables.
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "600"))
+RESPONSE_CACHE_MAX_SIZE = 256
+
+_WS_RE = re.compile(r"\s+")
+
+# key → (stored_at, output). Accessed from the event loop only, so no lock is needed.
+_cache: "OrderedDict[bytes, tuple[float, AgentOutput]]" = OrderedDict()
+
+
+def _normalize(transcript: str) -> str:
+    return _WS_RE.sub(" ", transcript).strip().casefold()
+
+
+def _key(transcript: str, handoff_time: str, context: str | None) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for part in (_normalize(transcript), handoff_time, context or ""):
+        h.update(part.encode())
+        h.update(b"\0")   # field separator, so ("ab", "c") != ("a", "bc")
+    return h.digest()
+
+
+def lookup(transcript: str, handoff_time: str, context: str | None) -> AgentOutput | None:
+    """Return a copy of the cached output for these exact inputs, or None."""
+    if RESPONSE_CACHE_TTL_SECONDS <= 0:
+        return None
+    key = _key(transcript, handoff_time, context)
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    stored_at, output = entry
+    if time.monotonic() - stored_at > RESPONSE_CACHE_TTL_SECONDS:
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return output.model_copy(deep=True, update={"processing_time_ms": 0})
+
+
+def store(
+    transcript: str,
+    handoff_time: str,
+    context: str | None,
+    output: AgentOutput,
+) -> None:
+    """Cache a complete pipeline result (degraded results are never cached)."""
+    if RESPONSE_CACHE_TTL_SECONDS <= 0 or output.degraded_layers:
+        return
+    key = _key(transcript, handoff_time, context)
+    _cache[key] = (time.monotonic(), output.model_copy(deep=True))
+    _cache.move_to_end(key)
+    if len(_cache) > RESPONSE_CACHE_MAX_SIZE:
+        _cache.popitem(last=False)
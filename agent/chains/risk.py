@@ -1,17 +1,19 @@
+import functools
 import logging
+from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from models import RiskAssessment, RiskSeverity
-from chains.llm import llm, invoke_structured
-from chains.knowledge_base import query_clinical_knowledge
+from chains.llm import get_llm, with_prompt_cache, invoke_structured, to_prompt_json
+from chains.knowledge_base import aquery_clinical_knowledge
 
 logger = logging.getLogger("agent.chains.risk")
 
 risk_prompt = ChatPromptTemplate.from_messages([
-    ("system", """You are a clinical safety checker for nursing handoffs.
+    SystemMessage(content="""You are a clinical safety checker for nursing handoffs.
 Analyze ONLY for DANGEROUS combinations that REQUIRE immediate nurse action.
 
-RETRIEVED CLINICAL KNOWLEDGE (primary reference):
-{rag_context}
+Use the RETRIEVED CLINICAL KNOWLEDGE in the user message as your primary reference.
 
 CRITERIA FOR EMPTY ALERTS (stable case):
 - All vitals normal: BP 100-140/60-90, HR 60-100, RR 12-20, Temp 98-99
@@ -20,25 +22,32 @@ CRITERIA FOR EMPTY ALERTS (stable case):
 
 Return ONLY valid JSON matching this EXACT schema:
 
-{{
+{
   "alerts": [array — EMPTY IF NO DANGEROUS PATTERNS],
   "overall_risk": "CRITICAL" or "HIGH" or "MEDIUM" or "LOW",
   "risk_score": 100 or 75 or 50 or 25 or 0
-}}
+}
 
 SCORING (MUST FOLLOW):
 - CRITICAL = 100, HIGH = 75, MEDIUM = 50, LOW = 25, NO_ALERTS = 0
 - overall_risk = highest severity alert (LOW if empty)
 
 Output ONLY the JSON object, no explanation."""),
-    ("human", """Extracted Patient Data: {extracted}
+    ("human", """RETRIEVED CLINICAL KNOWLEDGE:
+{rag_context}
+
+Extracted Patient Data: {extracted}
 Temporal Information: {temporal}
 Handoff Time: {handoff_time}
 
 JSON only:""")
 ])
 
-risk_chain = risk_prompt | llm  # Now uses CORRECT single prompt
+
+@functools.lru_cache(maxsize=None)
+def _risk_chain():
+    return risk_prompt | with_prompt_cache(get_llm(), "risk") | StrOutputParser()  # raw text — parsed by invoke_structured
+
 
 _SCORE_MAP = {
     RiskSeverity.CRITICAL: 100,
@@ -46,13 +55,16 @@ _SCORE_MAP = {
     RiskSeverity.MEDIUM: 50,
     RiskSeverity.LOW: 25,
 }
+_SEV_CRITICAL = RiskSeverity.CRITICAL
 
-def _build_risk_query(extracted: dict) -> str:
-    meds = [m.get("name", "") for m in extracted.get("medications", [])]
-    symptoms = [s.get("description", "") for s in extracted.get("symptoms", [])]
-    vitals = [f"{v.get('type', '')} {v.get('value', '')}" for v in extracted.get("vitals", [])]
-    chief = extracted.get("summary", {}).get("chief_complaint", "")
-    return " ".join(filter(None, meds + symptoms + vitals + [chief]))
+def build_risk_query(extracted: dict) -> str:
+    # one generator straight into join — no intermediate lists or filter object
+    return " ".join(x for x in (
+        *(m.get("name", "") for m in extracted.get("medications", ())),
+        *(s.get("description", "") for s in extracted.get("symptoms", ())),
+        *(f"{v.get('type', '')} {v.get('value', '')}" for v in extracted.get("vitals", ())),
+        extracted.get("summary", {}).get("chief_complaint", ""),
+    ) if x)
 
 def _compute_overall_risk(result: RiskAssessment) -> None:
     if not result.alerts:
@@ -60,24 +72,38 @@ def _compute_overall_risk(result: RiskAssessment) -> None:
         result.risk_score = 0
         return
     
-    severities = [alert.severity for alert in result.alerts]
-    severity_order = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
-    highest_severity = max(severities, key=lambda s: severity_order.index(s))
-    
+    # _SCORE_MAP doubles as the severity ordinal; CRITICAL can't be beaten, so stop there
+    highest_severity = RiskSeverity.LOW
+    for alert in result.alerts:
+        if alert.severity is _SEV_CRITICAL:
+            highest_severity = _SEV_CRITICAL
+            break
+        if _SCORE_MAP.get(alert.severity, 0) > _SCORE_MAP[highest_severity]:
+            highest_severity = alert.severity
+
     result.overall_risk = highest_severity
-    result.risk_score = _SCORE_MAP.get(highest_severity, 0)
+    result.risk_score = _SCORE_MAP[highest_severity]
+
+async def retrieve_risk_context(extracted: dict) -> str:
+    """KB lookup for Layer 3 — only needs Layer 1 output, so callers can start it early."""
+    return await aquery_clinical_knowledge(build_risk_query(extracted), n_results=3)
+
+async def detect_risks(
+    extracted: dict,
+    temporal: dict,
+    handoff_time: str = "07:00",
+    rag_context: str | None = None,
+) -> RiskAssessment:
+    if rag_context is None:
+        rag_context = await retrieve_risk_context(extracted)
 
-async def detect_risks(extracted: dict, temporal: dict, handoff_time: str = "07:00") -> RiskAssessment:
-    query = _build_risk_query(extracted)
-    rag_context = query_clinical_knowledge(query, n_results=3)
-    
     logger.info("Risk detection | time=%s | kb_docs=%d", handoff_time, 
-                len(rag_context.split('\n')) if rag_context else 0)
+                rag_context.count('\n') + 1 if rag_context else 0)
 
     try:
-        result = await invoke_structured(risk_chain, {
-            "extracted": str(extracted),
-            "temporal": str(temporal),
+        result = await invoke_structured(_risk_chain(), {
+            "extracted": to_prompt_json(extracted),
+            "temporal": to_prompt_json(temporal),
             "handoff_time": handoff_time,
             "rag_context": rag_context or "No clinical knowledge retrieved.",
         }, RiskAssessment)
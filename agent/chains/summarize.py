@@ -1,12 +1,14 @@
-import json
+import functools
 import logging
-import re
 from typing import Any
 
+import orjson
+
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 from models import HinglishSummary
-from chains.llm import llm_fast
+from chains.llm import extract_json_text, get_llm_fast, to_prompt_json, with_prompt_cache
 
 logger = logging.getLogger("agent.chains.summarize")
 
@@ -19,7 +21,7 @@ _FALLBACK = HinglishSummary(
 )
 
 hinglish_prompt = ChatPromptTemplate.from_messages([
-    ("system", """
+    SystemMessage(content="""
 Tu ek senior Indian nurse hai jo incoming nurse ko shift handoff deta/deti hai.
 Neeche diya gaya structured clinical data le aur ek concise Hinglish handoff summary banao.
 
@@ -29,7 +31,7 @@ Hinglish guidelines:
 
 Return a VALID JSON object with EXACTLY these keys. No markdown, no extra text — just the JSON.
 
-{{
+{
   "patient_overview": "<1-2 lines: patient name, bed, diagnosis, current status>",
   "medications": [
     "<Medication name, dose (agar pata ho), time given / next due. Unknown ho to 'Not stated'>"
@@ -43,7 +45,7 @@ Return a VALID JSON object with EXACTLY these keys. No markdown, no extra text 
   "action_items": [
     "<Specific nursing step — Confirm/Check/Monitor/Notify verb se shuru karo>"
   ]
-}}
+}
 
 Rules:
 - risk_alerts empty array agar koi risk nahi.
@@ -70,16 +72,15 @@ Now return the JSON object:
     """.strip())
 ])
 
-_hinglish_chain = hinglish_prompt | llm_fast | StrOutputParser()
+
+@functools.lru_cache(maxsize=None)
+def _hinglish_chain():
+    return hinglish_prompt | with_prompt_cache(get_llm_fast(), "hinglish") | StrOutputParser()
 
 
 def _extract_json(raw: str) -> dict[str, Any]:
-    """Strip markdown fences if the LLM wraps output in ```json ... ```."""
-    cleaned = raw.strip()
-    fence_match = re.search(r"```(?:json)?\s*(.*?)```", cleaned, re.DOTALL)
-    if fence_match:
-        cleaned = fence_match.group(1).strip()
-    return json.loads(cleaned)
+    """Strip markdown fences / surrounding prose and parse the JSON object."""
+    return orjson.loads(extract_json_text(raw))
 
 
 async def generate_hinglish_summary(
@@ -98,11 +99,11 @@ async def generate_hinglish_summary(
         len(omissions.get("omissions", [])),
     )
     try:
-        raw = await _hinglish_chain.ainvoke({
-            "extracted": str(extracted),
-            "temporal": str(temporal),
-            "risks": str(risks),
-            "omissions": str(omissions),
+        raw = await _hinglish_chain().ainvoke({
+            "extracted": to_prompt_json(extracted),
+            "temporal": to_prompt_json(temporal),
+            "risks": to_prompt_json(risks),
+            "omissions": to_prompt_json(omissions),
         })
 
         data = _extract_json(raw)
@@ -1,18 +1,23 @@
+import functools
+import hashlib
 import logging
+import os
 import re
-from datetime import datetime, timedelta
+import time
+import types
+from collections import OrderedDict
 
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from models import TemporalData, TemporalEvent
-from chains.llm import llm, invoke_structured
+from chains.llm import get_llm, with_prompt_cache, invoke_structured, to_prompt_json
 
 logger = logging.getLogger("agent.chains.temporal")
 
-temporal_prompt = ChatPromptTemplate.from_messages([
-    ("system", """You are a temporal reasoning engine for healthcare handoffs.
+_TEMPORAL_SYSTEM = SystemMessage(content="""You are a temporal reasoning engine for healthcare handoffs.
 Your job: (1) convert relative times to absolute timestamps, (2) calculate next dose times.
-
-Handoff happening at: {handoff_time}
+The handoff time is given in the user message.
 
 ━━━ TIME CONVERSION RULES ━━━
 - "4 hours ago"            → subtract 4h from handoff_time
@@ -47,38 +52,104 @@ OUTPUT FORMAT RULE:
 
 Return ONLY valid JSON matching this EXACT schema:
 
-{{
+{
   "handoff_time": "HH:MM",
   "events": [
-    {{
+    {
       "event": "description of what happened",
       "absolute_time": "HH:MM",
       "relative_original": "exact phrase from transcript"
-    }}
+    }
   ],
   "next_dose_times": [
     "08:00 (next day) - Azithromycin (OD — inferred)",
     "20:00 - Vancomycin (q8h — stated)"
   ],
-  "calculated_times": {{
+  "calculated_times": {
     "Azithromycin_frequency_source": "inferred — not stated in transcript",
     "Vancomycin_frequency_source": "stated — 'q8h' in transcript"
-  }}
-}}
+  }
+}
 
 Strict rules:
 - field names: event, absolute_time, relative_original — NOT type, NOT time
 - Populate next_dose_times for EVERY medication that was administered
 - Populate calculated_times for EVERY medication with its frequency_source
-- Output ONLY the JSON object, no markdown, no explanation"""),
-    ("human", """Transcript: {transcript}
+- Output ONLY the JSON object, no markdown, no explanation""")
+
+_TEMPORAL_HUMAN = """Handoff happening at: {handoff_time}
+
+Transcript: {transcript}
 Extracted Entities: {entities}
-Handoff Time: {handoff_time}
 
-Return ONLY the JSON:""")
-])
+Return ONLY the JSON:"""
+
+
+def _render_temporal_messages(inputs: dict) -> list:
+    # The system message is one prebuilt object and the human turn a single
+    # str.format — skips ChatPromptTemplate's per-call template formatting
+    return [_TEMPORAL_SYSTEM, HumanMessage(content=_TEMPORAL_HUMAN.format(**inputs))]
+
+
+temporal_prompt = RunnableLambda(_render_temporal_messages)
+
+
+TEMPORAL_CACHE_MAX_SIZE = 512
+TEMPORAL_CACHE_TTL = float(os.environ.get("TEMPORAL_CACHE_TTL", "600"))   # seconds; 0 disables
+
+# key → (stored_at, result). Only successful LLM results are cached — never the
+# regex fallback. Accessed from the event loop only, so no lock is needed.
+_temporal_cache: "OrderedDict[bytes, tuple[float, TemporalData]]" = OrderedDict()
+
+
+def _cache_key(transcript: str, entities_json: str, handoff_time: str) -> bytes:
+    return hashlib.blake2b(
+        f"{handoff_time}|{transcript}|{entities_json}".encode(), digest_size=16
+    ).digest()
+
+
+def _cache_get(key: bytes) -> TemporalData | None:
+    entry = _temporal_cache.get(key)
+    if entry is None:
+        return None
+    stored_at, result = entry
+    if time.monotonic() - stored_at > TEMPORAL_CACHE_TTL:
+        del _temporal_cache[key]
+        return None
+    _temporal_cache.move_to_end(key)
+    # Callers get their own copy — mutating it can't poison the cached entry
+    return result.model_copy(deep=True)
+
+
+def _cache_put(key: bytes, result: TemporalData) -> None:
+    _temporal_cache[key] = (time.monotonic(), result.model_copy(deep=True))
+    _temporal_cache.move_to_end(key)
+    if len(_temporal_cache) > TEMPORAL_CACHE_MAX_SIZE:
+        _temporal_cache.popitem(last=False)
 
-temporal_chain = temporal_prompt | llm  # raw output — parsed by invoke_structured
+
+# "07:00", "0700", "7:00 PM", "07:00pm", "7 PM" → groups (hour, minute, meridiem);
+# minute is None when omitted
+_HANDOFF_RE = re.compile(r'^\s*(\d{1,2})(?::?(\d{2}))?\s*(AM|PM)?\s*$', re.IGNORECASE)
+
+
+def _normalize_handoff_time(handoff_time: str) -> str:
+    """Normalise the request's handoff time to 24h HH:MM (unparseable input is passed through)."""
+    match = _HANDOFF_RE.match(handoff_time)
+    if match is None:
+        return handoff_time.strip()
+    hour, minute, meridiem = int(match.group(1)), match.group(2) or "00", match.group(3)
+    if meridiem:
+        if meridiem.upper() == "PM" and hour < 12:
+            hour += 12
+        elif meridiem.upper() == "AM" and hour == 12:
+            hour = 0
+    return f"{hour:02d}:{minute}"
+
+
+@functools.lru_cache(maxsize=None)
+def _temporal_chain():
+    return temporal_prompt | with_prompt_cache(get_llm(), "temporal") | StrOutputParser()  # raw text — parsed by invoke_structured
 
 
 async def resolve_temporal(transcript: str, entities: dict, handoff_time: str = "07:00") -> TemporalData:
@@ -86,18 +157,26 @@ async def resolve_temporal(transcript: str, entities: dict, handoff_time: str =
     Layer 2: Convert relative times to absolute timestamps.
     Handles Hindi time phrases (subah, raat, dopahar).
     """
-    handoff_time = handoff_time.replace(" AM", "").replace(" PM", "").replace(" ", "")
-    if len(handoff_time) == 4 and ":" not in handoff_time:
-        handoff_time = f"{handoff_time[:2]}:{handoff_time[2:]}"
+    handoff_time = _normalize_handoff_time(handoff_time)
+
+    entities_json = to_prompt_json(entities)
+    key = _cache_key(transcript, entities_json, handoff_time)
+    if TEMPORAL_CACHE_TTL > 0:
+        cached = _cache_get(key)
+        if cached is not None:
+            logger.info("Temporal cache hit | handoff_time=%s", handoff_time)
+            return cached
 
     logger.info("Resolving temporal references | handoff_time=%s", handoff_time)
     try:
-        result = await invoke_structured(temporal_chain, {
+        result = await invoke_structured(_temporal_chain(), {
             "transcript": transcript,
-            "entities": str(entities),
+            "entities": entities_json,
             "handoff_time": handoff_time
         }, TemporalData)
         logger.info("Temporal resolution complete | events=%d next_doses=%d", len(result.events), len(result.next_dose_times))
+        if TEMPORAL_CACHE_TTL > 0:
+            _cache_put(key, result)
         return result
     except Exception as e:
         logger.error("Temporal LLM failed, using regex fallback: %s", e)
@@ -105,7 +184,7 @@ async def resolve_temporal(transcript: str, entities: dict, handoff_time: str =
 
 
 # Maps Hindi/Urdu time-period words to a fixed absolute HH:MM for fallback use
-_HINDI_TIME_MAP: dict[str, str] = {
+_RAW_HINDI_TIME_MAP: dict[str, str] = {
     "subah": "08:00",
     "savere": "07:00",
     "dopahar": "14:00",
@@ -118,35 +197,59 @@ _HINDI_TIME_MAP: dict[str, str] = {
     "evening": "18:00",
     "night": "22:00",
 }
+# Read-only view keyed by casefolded word — matches from the scanner are
+# casefolded the same way, so "Raat"/"RAAT" hit without a second lookup
+_HINDI_TIME_MAP = types.MappingProxyType({k.casefold(): v for k, v in _RAW_HINDI_TIME_MAP.items()})
+
+
+# Every fallback pattern fused into one compiled alternation, so the transcript
+# is scanned in a single pass; the named group that matched picks the formatter.
+# Time words are sorted longest first so "shaam" wins over its prefix "sham".
+_FALLBACK_RE = re.compile(
+    r"(?P<num>\d+)\s*(?:"
+    r"(?P<baje>baje)"
+    r"|(?P<meridiem>am|pm)"
+    r"|(?P<oclock>o'?clock)"
+    r"|(?P<ago>hours?\s*ago)"
+    r")"
+    r"|\b(?P<word>" + "|".join(sorted(_HINDI_TIME_MAP, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
 
 
 def _fallback_temporal_parsing(transcript: str, handoff_time: str) -> TemporalData:
     """Regex + keyword fallback for temporal parsing when LLM is unavailable."""
     logger.warning("Using regex fallback for temporal parsing")
     events: list[TemporalEvent] = []
+    seen_words: set[str] = set()
+    base = _parse_hhmm(handoff_time)   # parsed once, reused for every "N hours ago"
 
-    numeric_patterns = [
-        (r'(\d+)\s*baje', lambda m: f"{int(m.group(1)):02d}:00"),
-        (r'(\d+)\s*(am|pm)', lambda m: f"{m.group(1)}:00 {m.group(2).upper()}"),
-        (r'(\d+)\s*o\'?clock', lambda m: f"{int(m.group(1)):02d}:00"),
-        (r'(\d+)\s*hours?\s*ago', lambda m: _hours_ago(handoff_time, int(m.group(1)))),
-    ]
-
-    for pattern, formatter in numeric_patterns:
-        for match in re.finditer(pattern, transcript, re.IGNORECASE):
-            events.append(TemporalEvent(
-                event=f"Time reference: {match.group()}",
-                absolute_time=formatter(match),
-                relative_original=match.group()
-            ))
-
-    for word, absolute_time in _HINDI_TIME_MAP.items():
-        if re.search(rf'\b{word}\b', transcript, re.IGNORECASE):
+    for match in _FALLBACK_RE.finditer(transcript):
+        word = match.group("word")
+        if word is not None:
+            word = word.casefold()
+            if word in seen_words:
+                continue  # one event per time-period word
+            seen_words.add(word)
             events.append(TemporalEvent(
                 event=f"Time period: {word}",
-                absolute_time=absolute_time,
+                absolute_time=_HINDI_TIME_MAP[word],
                 relative_original=word,
             ))
+            continue
+
+        num = match.group("num")
+        if match.group("meridiem"):
+            absolute_time = f"{num}:00 {match.group('meridiem').upper()}"
+        elif match.group("ago"):
+            absolute_time = _hours_ago(handoff_time, int(num), base) if base else handoff_time
+        else:  # baje / o'clock
+            absolute_time = f"{int(num):02d}:00"
+        events.append(TemporalEvent(
+            event=f"Time reference: {match.group()}",
+            absolute_time=absolute_time,
+            relative_original=match.group()
+        ))
 
     return TemporalData(
         handoff_time=handoff_time,
@@ -156,11 +259,26 @@ def _fallback_temporal_parsing(transcript: str, handoff_time: str) -> TemporalDa
     )
 
 
-def _hours_ago(handoff_time: str, hours: int) -> str:
-    """Subtract hours from handoff_time string (HH:MM) and return HH:MM."""
+def _parse_hhmm(handoff_time: str) -> tuple[int, int] | None:
+    """Split H:MM / HH:MM into (hour, minute); None if malformed or out of range."""
+    colon = len(handoff_time) - 3
+    if colon not in (1, 2) or handoff_time[colon] != ":":
+        return None
     try:
-        base = datetime.strptime(handoff_time, "%H:%M")
-        result = base - timedelta(hours=hours)
-        return result.strftime("%H:%M")
+        h, m = int(handoff_time[:colon]), int(handoff_time[colon + 1:])
     except ValueError:
-        return handoff_time
+        return None
+    if h > 23 or m > 59:
+        return None
+    return h, m
+
+
+def _hours_ago(handoff_time: str, hours: int, base: tuple[int, int] | None = None) -> str:
+    """Subtract hours from handoff_time string (HH:MM) and return HH:MM."""
+    # Plain integer math, no strptime/strftime; callers in a loop pass the parsed base
+    if base is None:
+        base = _parse_hhmm(handoff_time)
+        if base is None:
+            return handoff_time
+    h, m = base
+    return f"{(h - hours) % 24:02d}:{m:02d}"
@@ -0,0 +1,71 @@
+"""Minimal wildcard CORS — precomputed header bytes instead of per-request CORSMiddleware work.
+
+Kept in sync with backend/app/cors.py — agent and backend ship as separate services with
+no shared package, so change both copies together.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, MutableMapping
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+_ALLOW_ORIGIN = (b"access-control-allow-origin", b"*")
+
+# Built once. No allow-credentials: browsers reject "*" combined with credentials,
+# and the frontend authenticates with a bearer header, not cookies.
+_PREFLIGHT_HEADERS = [
+    _ALLOW_ORIGIN,
+    (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+    (b"access-control-max-age", b"600"),
+    (b"content-length", b"0"),
+]
+
+
+class WildcardCORSMiddleware:
+    """
+    Pure ASGI CORS for `allow_origins=["*"]`: preflights are answered directly
+    with a fixed header block; every other response gets one extra header.
+    """
+
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if (
+            scope["method"] == "OPTIONS"
+            and _request_header(scope, b"access-control-request-method") is not None
+        ):
+            await self._preflight(scope, send)
+            return
+
+        async def send_with_origin(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), _ALLOW_ORIGIN]
+            await send(message)
+
+        await self.app(scope, receive, send_with_origin)
+
+    @staticmethod
+    async def _preflight(scope: Scope, send: Send) -> None:
+        headers = _PREFLIGHT_HEADERS
+        # The "*" wildcard doesn't cover Authorization, so echo what was asked for
+        requested_headers = _request_header(scope, b"access-control-request-headers")
+        if requested_headers:
+            headers = [*headers, (b"access-control-allow-headers", requested_headers)]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+
+
+def _request_header(scope: Scope, name: bytes) -> bytes | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
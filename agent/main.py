@@ -4,22 +4,38 @@ os.environ["ANONYMIZED_TELEMETRY"] = "False"   # disable chromadb → posthog be
 from dotenv import load_dotenv
 load_dotenv()  # must be before any chain imports so MEGALLM_API_KEY is set
 
+import asyncio
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 import router
+from cors import WildcardCORSMiddleware
+from chains import warmup, warmup_llm
+from chains.llm import aclose_http_client, check_event_loop
+
+# Records go through a queue; a listener thread does the blocking stdout writes,
+# so a log call inside the pipeline never stalls the event loop. The QueueHandler
+# formats the record, the stdout handler just prints the finished line.
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+_log_listener.start()
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
-    stream=sys.stdout,
+    handlers=[QueueHandler(_log_queue)],
+    force=True,   # replace any handler an imported library installed first
 )
 
 # Suppress noisy third-party loggers
-for _noisy in ("httpx", "sentence_transformers", "huggingface_hub", "chromadb.telemetry", "openai._base_client"):
-    logging.getLogger(_noisy).setLevel(logging.ERROR)
+logging.getLogger("httpx").setLevel(logging.ERROR)
+logging.getLogger("huggingface_hub").setLevel(logging.ERROR)
+logging.getLogger("chromadb.telemetry").setLevel(logging.ERROR)
+logging.getLogger("openai._base_client").setLevel(logging.ERROR)
+logging.getLogger("uvicorn.access").disabled = True   # per-request access lines; the pipeline logs its own
 
 logger = logging.getLogger("agent.main")
 
@@ -29,13 +45,7 @@ app = FastAPI(
     version="1.0.0"
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(WildcardCORSMiddleware)   # any origin, no credentials
 
 # Include routers
 app.include_router(router.router)
@@ -43,6 +53,15 @@ app.include_router(router.router)
 @app.on_event("startup")
 async def on_startup() -> None:
     logger.info("Agent starting up")
+    check_event_loop()
+    # Model load, HNSW page-in and the first TLS handshake happen here, not on the first handoff
+    await asyncio.gather(warmup(), warmup_llm())
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await aclose_http_client()
+    _log_listener.stop()   # drains the queue before the process exits
 
 
 @app.get("/")
@@ -50,9 +69,12 @@ async def root():
     return {
         "message": "Agent",
         "layers": ["extract", "temporal", "risk", "omissions"],
-        "endpoints": ["/api/v1/extract", "/api/v1/risk", "/api/v1/health"]
+        "endpoints": ["/api/v1/extract", "/api/v1/extract/stream", "/api/v1/risk", "/api/v1/health"]
     }
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # uvloop (libuv) schedules the parallel LLM calls with less overhead than asyncio's selector loop
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    uvicorn.run(app, host="0.0.0.0", port=8001, loop=loop)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, field_validator, model_validator, AliasChoices, ConfigDict
+from pydantic import BaseModel, Field, field_validator, model_validator, AliasChoices, AliasGenerator, ConfigDict
 from typing import List, Optional
 from enum import Enum
 
@@ -30,31 +30,50 @@ class QuickRiskRequest(BaseModel):
         return v.strip()
 
 
+def _llm_aliases(extra: dict[str, tuple[str, ...]]) -> AliasGenerator:
+    """
+    Accept each field listed in extra under its own name, its spaced form
+    ("time given") and the synonyms the LLM tends to emit. Unlisted fields get
+    no alias and validate under their own name only.
+    """
+    def validation_alias(field: str) -> AliasChoices | None:
+        if field not in extra:
+            return None
+        return AliasChoices(*dict.fromkeys((field, field.replace("_", " "), *extra[field])))
+
+    return AliasGenerator(validation_alias=validation_alias)
+
+
 class Medication(BaseModel):
     """Accepts both 'time_given' and 'time' from the LLM."""
-    model_config = ConfigDict(populate_by_name=True)
-    name: str
-    dose: Optional[str] = Field(
-        default="not specified",  # LLM returns null when transcript omits dose
-        validation_alias=AliasChoices("dose", "dosage", "amount"),
-    )
-    time_given: str = Field(
-        default="unknown",
-        validation_alias=AliasChoices("time_given", "time", "time given", "time_administered"),
+    model_config = ConfigDict(
+        populate_by_name=True,
+        frozen=True,
+        alias_generator=_llm_aliases({
+            "dose": ("dosage", "amount"),
+            "time_given": ("time", "time_administered"),
+        }),
     )
+    name: str
+    dose: Optional[str] = "not specified"  # LLM returns null when transcript omits dose
+    time_given: str = "unknown"
     reason: Optional[str] = None
 
 
 class Vital(BaseModel):
-    model_config = ConfigDict(populate_by_name=True)
-    type: str = Field(validation_alias=AliasChoices("type", "vital_type", "vital"))
+    model_config = ConfigDict(
+        populate_by_name=True,
+        frozen=True,
+        alias_generator=_llm_aliases({
+            "type": ("vital_type", "vital"),
+            "trend": ("direction", "change"),
+        }),
+    )
+    type: str
     value: str
     systolic: Optional[int] = None                  
     diastolic: Optional[int] = None                 
-    trend: Optional[str] = Field(
-        default="unknown",
-        validation_alias=AliasChoices("trend", "direction", "change"),
-    )
+    trend: Optional[str] = "unknown"
 
 
 class Symptom(BaseModel):
@@ -63,14 +82,18 @@ class Symptom(BaseModel):
 
 
 class TemporalEvent(BaseModel):
-    event: str = Field(
-        validation_alias=AliasChoices("event", "type", "event_type", "description", "event_name")
-    )
-    absolute_time: str = Field(validation_alias=AliasChoices("absolute_time", "time", "absolute", "resolved_time"))
-    relative_original: str = Field(
-        default="",
-        validation_alias=AliasChoices("relative_original", "relative", "original", "time_since", "original_text"),
+    model_config = ConfigDict(
+        populate_by_name=True,
+        frozen=True,
+        alias_generator=_llm_aliases({
+            "event": ("type", "event_type", "description", "event_name"),
+            "absolute_time": ("time", "absolute", "resolved_time"),
+            "relative_original": ("relative", "original", "time_since", "original_text"),
+        }),
     )
+    event: str
+    absolute_time: str
+    relative_original: str = ""
 
 
 class RiskSeverity(str, Enum):
@@ -102,20 +125,19 @@ class Omission(BaseModel):
 
 
 class HandoffSummary(BaseModel):
-    model_config = ConfigDict(populate_by_name=True)
-    patient_name: str = Field(
-        default="Unknown",
-        validation_alias=AliasChoices("patient_name", "patient name", "name"),
-    )
-    bed: str = Field(
-        default="Not stated",
-        validation_alias=AliasChoices("bed", "bed_number", "bed number"),
+    model_config = ConfigDict(
+        populate_by_name=True,
+        frozen=True,
+        alias_generator=_llm_aliases({
+            "patient_name": ("name",),
+            "bed": ("bed_number", "bed number"),
+            "chief_complaint": ("complaint", "admission_reason"),
+        }),
     )
+    patient_name: str = "Unknown"
+    bed: str = "Not stated"
     age: Optional[int] = None
-    chief_complaint: Optional[str] = Field(
-        default=None,
-        validation_alias=AliasChoices("chief_complaint", "chief complaint", "complaint", "admission_reason"),
-    )
+    chief_complaint: Optional[str] = None
 
     @field_validator("bed", mode="before")
     @classmethod
@@ -208,3 +230,16 @@ class AgentOutput(BaseModel):
     omissions: OmissionAnalysis
     hinglish_summary: HinglishSummary
     processing_time_ms: int
+    degraded_layers: List[str] = []   # layers that failed/timed out and were returned empty
+
+
+class CombinedAnalysis(BaseModel):
+    """Layers 3+4 answered in one LLM call (PG_COMBINED_LAYERS=1)."""
+    risk_assessment: RiskAssessment = Field(
+        default_factory=RiskAssessment,
+        validation_alias=AliasChoices("risk_assessment", "risks", "risk"),
+    )
+    omission_analysis: OmissionAnalysis = Field(
+        default_factory=OmissionAnalysis,
+        validation_alias=AliasChoices("omission_analysis", "omissions_analysis", "omission"),
+    )
@@ -1,97 +1,299 @@
 import asyncio
 import logging
+import os
 import time
+from typing import Any, AsyncIterator, Awaitable
 
+import orjson
 from fastapi import APIRouter, HTTPException
-from models import AgentOutput, HandoffRequest, QuickRiskRequest
+from fastapi.responses import StreamingResponse
+from models import (
+    AgentOutput,
+    HandoffRequest,
+    OmissionAnalysis,
+    QuickRiskRequest,
+    RiskAssessment,
+    RiskSeverity,
+    TemporalData,
+)
 from chains.extract import extract_entities
 from chains.temporal import resolve_temporal
-from chains.risk import detect_risks
-from chains.omissions import analyze_omissions
+from chains.knowledge_base import abatch_query_clinical_knowledge
+from chains.risk import build_risk_query, detect_risks, retrieve_risk_context
+from chains.omissions import analyze_omissions, build_omission_query
+from chains.combined import COMBINED_LAYERS_ENABLED, analyze_risks_and_omissions
+from chains import response_cache
 from chains.summarize import generate_hinglish_summary
 
 logger = logging.getLogger("agent.router")
 
 router = APIRouter(prefix="/api/v1")
 
+# Temporal is started speculatively without entities, in parallel with extraction.
+# Past this many medications the entity context matters for next-dose times,
+# so the speculative result is dropped and temporal re-runs with entities.
+SPECULATION_MAX_MEDS = 3
+_speculation = {"hit": 0, "miss": 0}
 
-@router.post("/extract", response_model=AgentOutput)
-async def process_handoff(body: HandoffRequest) -> AgentOutput:
+# Deadline for risk + omissions together; past it the response ships without them
+PHASE2_TIMEOUT_SECONDS = float(os.environ.get("PHASE2_TIMEOUT_SECONDS", "45"))
+
+
+async def _await_temporal(
+    spec_task: "asyncio.Task[TemporalData]",
+    extracted: dict,
+    transcript: str,
+    handoff_time: str,
+) -> TemporalData:
+    """Keep the speculative temporal result, or re-fire with entities when they matter."""
+    if len(extracted.get("medications", ())) <= SPECULATION_MAX_MEDS:
+        _speculation["hit"] += 1
+        temporal = await spec_task
+    else:
+        _speculation["miss"] += 1
+        spec_task.cancel()
+        temporal = await resolve_temporal(transcript, extracted, handoff_time)
+    logger.info(
+        "Temporal speculation | hits=%d misses=%d", _speculation["hit"], _speculation["miss"]
+    )
+    return temporal
+
+
+def _task_result(task: "asyncio.Task | None", default: Any) -> Any:
+    """Result of a finished task, or default if it was cancelled, failed or never ran."""
+    if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+        return default
+    return task.result()
+
+
+async def _guarded(layer: str, coro: Awaitable[Any], default: Any) -> Any:
+    """Await one phase-2 layer; a failure is logged and swapped for default so its sibling keeps running."""
+    try:
+        return await coro
+    except Exception as e:
+        logger.error("Phase 2 layer %s failed: %r", layer, e)
+        return default
+
+
+async def _run_phase2(
+    body: HandoffRequest,
+    extracted_d: dict,
+    temporal: TemporalData,
+    temporal_d: dict,
+    risk_ctx: str,
+    omission_ctx: str,
+) -> tuple[RiskAssessment, OmissionAnalysis, list[str]]:
     """
-    Full 5-layer pipeline:
+    Risk + omissions under one deadline. A layer that fails or misses the
+    deadline is replaced by its empty result and reported in degraded_layers,
+    so a hung LLM call degrades the response instead of stalling it. Each layer
+    catches its own errors, so one failing never cancels the other.
+    """
+    context = body.patient_context or ""
+    risk_task = omission_task = combined_task = None
+    try:
+        async with asyncio.timeout(PHASE2_TIMEOUT_SECONDS):
+            async with asyncio.TaskGroup() as tg:
+                if COMBINED_LAYERS_ENABLED:
+                    logger.info("Phase 2  | risk + omissions in one combined call [gpt-oss-20b]")
+                    combined_task = tg.create_task(_guarded("combined", analyze_risks_and_omissions(
+                        body.transcript,
+                        extracted_d,
+                        temporal_d,
+                        body.handoff_time,
+                        context=context,
+                        temporal_calculated_times=temporal.calculated_times,
+                        risk_context=risk_ctx,
+                        omission_context=omission_ctx,
+                    ), (None, None)))
+                else:
+                    logger.info("Phase 2  | risk + omissions running in parallel [gpt-oss-20b]")
+                    risk_task = tg.create_task(_guarded("risk", detect_risks(
+                        extracted_d, temporal_d, body.handoff_time, rag_context=risk_ctx
+                    ), None))
+                    omission_task = tg.create_task(_guarded("omissions", analyze_omissions(
+                        body.transcript,
+                        extracted_d,
+                        {},
+                        context=context,
+                        temporal_calculated_times=temporal.calculated_times,
+                        rag_context=omission_ctx,
+                    ), None))
+    except TimeoutError:
+        logger.error("Phase 2 timed out after %gs — returning partial results", PHASE2_TIMEOUT_SECONDS)
+
+    if combined_task is not None:
+        risks, omissions = _task_result(combined_task, (None, None))
+    else:
+        risks = _task_result(risk_task, None)
+        omissions = _task_result(omission_task, None)
+
+    degraded = []
+    if risks is None:
+        degraded.append("risk")
+        risks = RiskAssessment(alerts=[], overall_risk=RiskSeverity.LOW, risk_score=0)
+    if omissions is None:
+        degraded.append("omissions")
+        omissions = OmissionAnalysis()
+    return risks, omissions, degraded
+
+
+async def _run_pipeline(body: HandoffRequest) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Full 5-layer pipeline as a stream of (phase, data) events:
 
-    Phase 1 (sequential):  Extract → Temporal
+    Phase 1 (parallel):    Extract ∥ Temporal      (speculative; KB retrieval overlaps Temporal)
     Phase 2 (parallel):    Risk ∥ Omissions       [gpt-oss-20b]
     Phase 3 (sequential):  Hinglish Summary        [gemini-2.5-flash-lite]
+
+    Layer events carry the layer's dumped dict; the last event is always
+    ("complete", AgentOutput).
     """
     start = time.time()
+    cached = response_cache.lookup(body.transcript, body.handoff_time, body.patient_context)
+    if cached is not None:
+        logger.info("Pipeline served from response cache")
+        # Same event sequence as a live run, so stream consumers needn't special-case hits
+        yield "extract", cached.extracted.model_dump()
+        yield "temporal", cached.temporal.model_dump()
+        yield "risks", cached.risks.model_dump()
+        yield "omissions", cached.omissions.model_dump()
+        yield "complete", cached
+        return
+
+    # Phase 1 — extract, with temporal started speculatively alongside it
+    logger.info("Phase 1a | extract: entities (temporal speculative)")
+    temporal_task = asyncio.create_task(resolve_temporal(body.transcript, {}, body.handoff_time))
+    try:
+        extracted = await extract_entities(body.transcript)
+    except BaseException:
+        temporal_task.cancel()   # client went away or extraction blew up — don't leak the call
+        raise
+    # Dump each layer's output once and share the dict with every consumer
+    extracted_d = extracted.model_dump()
+    yield "extract", extracted_d
+
+    # KB lookups only need the extracted entities — start them now (one batched
+    # embedding + Chroma query) so they run while the temporal LLM call is in flight
+    kb_task = asyncio.create_task(abatch_query_clinical_knowledge([
+        build_risk_query(extracted_d),
+        build_omission_query(extracted_d),
+    ]))
+
+    logger.info("Phase 1b | temporal: resolving time references")
+    try:
+        temporal = await _await_temporal(temporal_task, extracted_d, body.transcript, body.handoff_time)
+    except BaseException:
+        kb_task.cancel()
+        raise
+    temporal_d = temporal.model_dump()
+    yield "temporal", temporal_d
+    risk_ctx, omission_ctx = await kb_task
+
+    # Phase 2 — risk and omissions are independent of each other
+    risks, omissions, degraded = await _run_phase2(
+        body, extracted_d, temporal, temporal_d, risk_ctx, omission_ctx
+    )
+    risks_d = risks.model_dump()
+    omissions_d = omissions.model_dump()
+    yield "risks", risks_d
+    yield "omissions", omissions_d
+
+    # Phase 3 — Hinglish summary (depends on all previous output)
+    logger.info("Phase 3  | hinglish summary [gemini-2.5-flash-lite]")
+    hinglish = await generate_hinglish_summary(extracted_d, temporal_d, risks_d, omissions_d)
+
+    processing_time = int((time.time() - start) * 1000)
     logger.info(
-        "POST /extract | handoff_time=%s | transcript_len=%d | has_context=%s",
+        "Pipeline complete | overall_risk=%s | risk_score=%d | omissions=%d | degraded=%s | ms=%d",
+        risks.overall_risk,
+        risks.risk_score,
+        len(omissions.omissions),
+        degraded or "none",
+        processing_time,
+    )
+
+    output = AgentOutput(
+        extracted=extracted,
+        temporal=temporal,
+        risks=risks,
+        omissions=omissions,
+        hinglish_summary=hinglish,
+        processing_time_ms=processing_time,
+        degraded_layers=degraded,
+    )
+    response_cache.store(body.transcript, body.handoff_time, body.patient_context, output)
+    yield "complete", output
+
+
+def _log_request(endpoint: str, body: HandoffRequest) -> None:
+    logger.info(
+        "POST %s | handoff_time=%s | transcript_len=%d | has_context=%s",
+        endpoint,
         body.handoff_time,
         len(body.transcript),
         body.patient_context is not None,
     )
 
-    try:
-        # Phase 1 — Sequential (each depends on the previous)
-        logger.info("Phase 1a | extract: entities")
-        extracted = await extract_entities(body.transcript)
-
-        logger.info("Phase 1b | temporal: resolving time references")
-        temporal = await resolve_temporal(body.transcript, extracted.dict(), body.handoff_time)
-
-        # Phase 2 — Parallel (risk and omissions are independent of each other)
-        logger.info("Phase 2  | risk + omissions running in parallel [gpt-oss-20b]")
-        risks, omissions = await asyncio.gather(
-            detect_risks(extracted.dict(), temporal.dict(), body.handoff_time),
-            analyze_omissions(
-                body.transcript,
-                extracted.dict(),
-                {},
-                context=body.patient_context or "",
-                temporal_calculated_times=temporal.calculated_times,
-            ),
-        )
-
-        # Phase 3 — Hinglish summary (depends on all previous output)
-        logger.info("Phase 3  | hinglish summary [gemini-2.5-flash-lite]")
-        hinglish = await generate_hinglish_summary(
-            extracted.dict(),
-            temporal.dict(),
-            risks.dict(),
-            omissions.dict(),
-        )
-
-        processing_time = int((time.time() - start) * 1000)
-        logger.info(
-            "Pipeline complete | overall_risk=%s | risk_score=%d | omissions=%d | ms=%d",
-            risks.overall_risk,
-            risks.risk_score,
-            len(omissions.omissions),
-            processing_time,
-        )
-
-        return AgentOutput(
-            extracted=extracted,
-            temporal=temporal,
-            risks=risks,
-            omissions=omissions,
-            hinglish_summary=hinglish,
-            processing_time_ms=processing_time,
-        )
 
+@router.post("/extract", response_model=AgentOutput)
+async def process_handoff(body: HandoffRequest) -> AgentOutput:
+    """Full 5-layer pipeline, answered as one AgentOutput once every layer is done."""
+    _log_request("/extract", body)
+    try:
+        async for phase, data in _run_pipeline(body):
+            if phase == "complete":
+                return data
+        raise RuntimeError("pipeline ended without a result")
     except Exception as e:
         logger.exception("Pipeline failed: %s", e)
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
 
 
+@router.post("/extract/stream")
+async def process_handoff_stream(body: HandoffRequest) -> StreamingResponse:
+    """
+    Same pipeline as /extract, streamed as NDJSON — one {"phase": ..., "data": ...}
+    line per layer as it finishes (extract, temporal, risks, omissions), then a
+    "complete" line with the full AgentOutput. The UI can render entities and
+    risks while the Hinglish summary is still generating. A failure mid-stream is
+    reported as a final {"phase": "error", "detail": ...} line (the 200 status is
+    already sent).
+    """
+    _log_request("/extract/stream", body)
+
+    async def ndjson() -> AsyncIterator[bytes]:
+        try:
+            async for phase, data in _run_pipeline(body):
+                if phase == "complete":
+                    data = data.model_dump()
+                yield orjson.dumps({"phase": phase, "data": data}) + b"\n"
+        except Exception as e:
+            logger.exception("Pipeline failed: %s", e)
+            yield orjson.dumps({"phase": "error", "detail": f"Processing error: {e}"}) + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
 @router.post("/risk")
 async def quick_risk_check(body: QuickRiskRequest):
     """Quick endpoint for just risk analysis (no omissions, no summary)."""
     logger.info("POST /risk | handoff_time=%s", body.handoff_time)
-    extracted = await extract_entities(body.transcript)
-    temporal = await resolve_temporal(body.transcript, extracted.dict(), body.handoff_time)
-    risks = await detect_risks(extracted.dict(), temporal.dict(), body.handoff_time)
+    temporal_task = asyncio.create_task(resolve_temporal(body.transcript, {}, body.handoff_time))
+    try:
+        extracted_d = (await extract_entities(body.transcript)).model_dump()
+    except BaseException:
+        temporal_task.cancel()
+        raise
+    risk_ctx_task = asyncio.create_task(retrieve_risk_context(extracted_d))
+    try:
+        temporal = await _await_temporal(temporal_task, extracted_d, body.transcript, body.handoff_time)
+    except BaseException:
+        risk_ctx_task.cancel()
+        raise
+    risks = await detect_risks(
+        extracted_d, temporal.model_dump(), body.handoff_time, rag_context=await risk_ctx_task
+    )
     logger.info("Quick risk check complete | overall_risk=%s", risks.overall_risk)
     return risks
 
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # agent/ — modules import as top-level
+os.environ.setdefault("MEGALLM_API_KEY", "test")
+
+from chains import response_cache
+from models import AgentOutput
+
+TRANSCRIPT = "Bed 4, 68M post CABG day 2. Patient reports chest pain overnight, BP 110/70, on heparin drip."
+
+
+def _output() -> AgentOutput:
+    return AgentOutput.model_construct(processing_time_ms=1234, degraded_layers=[])
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        response_cache._cache.clear()
+        response_cache.store(TRANSCRIPT, "07:00 AM", "", _output())
+
+    def test_same_transcript_hits_despite_whitespace_and_case(self) -> None:
+        cached = response_cache.lookup("  " + TRANSCRIPT.upper().replace(" ", "   "), "07:00 AM", "")
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached.processing_time_ms, 0)
+
+    def test_negation_is_a_miss(self) -> None:
+        negated = TRANSCRIPT.replace("reports chest pain", "reports no chest pain")
+        self.assertIsNone(response_cache.lookup(negated, "07:00 AM", ""))
+
+    def test_drug_swap_is_a_miss(self) -> None:
+        swapped = TRANSCRIPT.replace("heparin", "warfarin")
+        self.assertIsNone(response_cache.lookup(swapped, "07:00 AM", ""))
+
+    def test_different_context_or_time_is_a_miss(self) -> None:
+        self.assertIsNone(response_cache.lookup(TRANSCRIPT, "07:00 PM", ""))
+        self.assertIsNone(response_cache.lookup(TRANSCRIPT, "07:00 AM", "prior shift: stable"))
+
+    def test_degraded_output_is_not_stored(self) -> None:
+        response_cache._cache.clear()
+        degraded = AgentOutput.model_construct(processing_time_ms=1, degraded_layers=["risk"])
+        response_cache.store(TRANSCRIPT, "07:00 AM", "", degraded)
+        self.assertIsNone(response_cache.lookup(TRANSCRIPT, "07:00 AM", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
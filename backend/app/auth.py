@@ -1,11 +1,17 @@
 from datetime import datetime, timedelta, timezone
+import hashlib
 import os
+import threading
+import time
 from typing import Optional
 import jwt
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import models, schemas
 from app.database import get_db
@@ -16,11 +22,31 @@ ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES",
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# argon2id — new hashes use these parameters; bcrypt hashes from before the switch
+# still verify and are re-hashed on the user's next successful login
+_password_hasher = PasswordHasher(
+    time_cost=int(os.getenv("ARGON2_TIME_COST", "2")),
+    memory_cost=int(os.getenv("ARGON2_MEMORY_COST", "65536")),   # KiB
+    parallelism=1,
+)
+
+def _is_bcrypt_hash(hashed_password: str) -> bool:
+    return hashed_password.startswith(("$2a$", "$2b$", "$2y$"))
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    if _is_bcrypt_hash(hashed_password):
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    try:
+        return _password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True for legacy bcrypt hashes and argon2 hashes made with older parameters."""
+    return _is_bcrypt_hash(hashed_password) or _password_hasher.check_needs_rehash(hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return _password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -28,12 +54,48 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+# blake2b(token) → (user_id, expires_at). A bearer token is re-sent on every
+# request, so a hit skips jwt.decode and turns the email lookup into a PK get.
+# Keyed by digest so raw tokens aren't kept in memory; entries live at most
+# AUTH_CACHE_TTL_SECONDS (and never past the token's exp), so a deleted user or
+# revoked token stops resolving within that window.
+_AUTH_CACHE_MAX_SIZE = 10_000
+AUTH_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+_auth_cache: dict[bytes, tuple[int, float]] = {}
+_auth_cache_lock = threading.Lock()   # held for a dict op only — safe on the event loop
+
+def _token_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def _cached_user_id(key: bytes) -> Optional[int]:
+    with _auth_cache_lock:
+        entry = _auth_cache.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del _auth_cache[key]
+            return None
+        return entry[0]
+
+def _cache_user_id(key: bytes, user_id: int, exp: float) -> None:
+    with _auth_cache_lock:
+        if len(_auth_cache) >= _AUTH_CACHE_MAX_SIZE:
+            _auth_cache.pop(next(iter(_auth_cache)))   # oldest insert first
+        _auth_cache[key] = (user_id, min(exp, time.time() + AUTH_CACHE_TTL_SECONDS))
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> models.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    key = _token_key(token)
+    user_id = _cached_user_id(key)
+    if user_id is not None:
+        user = await db.get(models.User, user_id)
+        if user is None: raise credentials_exception
+        return user
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -41,6 +103,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except jwt.PyJWTError:
         raise credentials_exception
         
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == email))
     if user is None: raise credentials_exception
+    _cache_user_id(key, user.id, payload["exp"])
     return user
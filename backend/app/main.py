@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
 import sys
 
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import text
 
 from app import models
+from app.cors import WildcardCORSMiddleware
 from app.database import engine
+from app.services import agent_client
+from app.services.transcription_service import transcription_service
 from app.routers import auth_routes, user_routes, patient_routes, handoff_routes
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -22,12 +27,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger("backend.main")
 
-# ─────────────────────────────────────────────────────────────────────────────
-# DB — auto-create tables (dev convenience; use Alembic for prod)
-# ─────────────────────────────────────────────────────────────────────────────
-
-models.Base.metadata.create_all(bind=engine)
-
 # ─────────────────────────────────────────────────────────────────────────────
 # App
 # ─────────────────────────────────────────────────────────────────────────────
@@ -40,13 +39,52 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],   # tighten in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# ─────────────────────────────────────────────────────────────────────────────
+# DB — auto-create tables (dev convenience; use Alembic for prod)
+# ─────────────────────────────────────────────────────────────────────────────
+
+@app.on_event("startup")
+async def create_tables() -> None:
+    # Off unless DB_AUTO_CREATE=1 — create_all inspects every table on each cold
+    # start; production schemas are managed by migrations run before deploy.
+    # It never alters an existing table: upgrade older databases with
+    # migrations/001_schema_upgrade.sql
+    if os.getenv("DB_AUTO_CREATE") != "1":
+        return
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+
+@app.on_event("startup")
+async def warm_db_pool() -> None:
+    # The first pooled connection pays for TCP + auth + asyncpg setup and the
+    # dialect's one-off server probes — do it here, not on the first request.
+    # A database that isn't up yet is logged, not fatal; the pool connects lazily.
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as exc:
+        logger.warning("DB warmup failed: %s", exc)
+
+
+@app.on_event("startup")
+async def warm_stt_model() -> None:
+    # Not awaited — the weights take a while to load and the API should come up
+    # meanwhile; the first upload simply queues behind the load on the STT thread
+    app.state.stt_warmup = asyncio.create_task(transcription_service.warmup())   # keep a reference
+
+
+@app.on_event("shutdown")
+async def dispose_engine() -> None:
+    await engine.dispose()
+
+
+@app.on_event("shutdown")
+async def close_agent_client() -> None:
+    await agent_client.aclose()
+
+
+app.add_middleware(WildcardCORSMiddleware)   # any origin, no credentials — tighten in production
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Routers
@@ -73,6 +111,7 @@ def root() -> dict:
             "users": ["/users/me"],
             "patients": [
                 "/api/patients/",
+                "/api/patients/stream",
                 "/api/patients/{id}",
                 "/api/patients/{id}/dashboard",
                 "/api/patients/{id}/vitals",
@@ -82,7 +121,9 @@ def root() -> dict:
             "handoffs": [
                 "/api/handoffs/process",
                 "/api/handoffs/{id}",
+                "/api/handoffs/{id}/analysis",
                 "/api/handoffs/patient/{id}",
+                "/api/handoffs/patient/{id}/summaries",
             ],
         },
     }
@@ -1,17 +1,39 @@
-from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from typing import Any, Dict, List
+
+from sqlalchemy import (
+    Column, Computed, Integer, String, Text, ForeignKey, DateTime, Enum, Float, Index, UniqueConstraint,
+    func, insert, text,
+)
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import deferred, relationship
 
 from app.database import Base
 
+
+class BulkCreateMixin:
+    """For child rows written straight from agent JSON — no ORM objects needed."""
+
+    @classmethod
+    async def bulk_create(cls, session: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+        # One Core executemany in the session's transaction (asyncpg batches it);
+        # skips building and tracking an ORM instance per row
+        if rows:
+            await session.execute(insert(cls), rows)
+
 # ----------------- Existing Auth Model -----------------
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Uniqueness needs a B-tree; the login/auth lookup is pure equality, which
+        # a hash index answers with a smaller index and fewer page reads
+        UniqueConstraint("email", name="uq_users_email"),
+        Index("ix_users_email_hash", "email", postgresql_using="hash"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
 
     # A nurse can have many handoffs
@@ -32,7 +54,7 @@ class Patient(Base):
     doctor = Column(String, nullable=True)          # Assigned doctor name
     ward = Column(String, nullable=True)            # Ward / unit name
     allergies = Column(ARRAY(String), nullable=True)  # e.g. ["Penicillin", "Latex"]
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     handoffs = relationship("Handoff", back_populates="patient", cascade="all, delete-orphan")
@@ -43,16 +65,71 @@ class Patient(Base):
 
 class Handoff(Base):
     __tablename__ = "handoffs"
+    __table_args__ = (
+        # jsonb_path_ops GIN — serves @> containment lookups into the agent output
+        # with a smaller index than the default jsonb_ops (which also covers ?/?|/?&).
+        # create_all only builds it with a new table; on an existing database run:
+        #   CREATE INDEX CONCURRENTLY ix_handoffs_agent_output_gin
+        #       ON handoffs USING GIN (agent_output_json jsonb_path_ops);
+        Index(
+            "ix_handoffs_agent_output_gin",
+            "agent_output_json",
+            postgresql_using="gin",
+            postgresql_ops={"agent_output_json": "jsonb_path_ops"},
+        ),
+        # Patient timeline: WHERE patient_id = ? ORDER BY shift_time DESC is one range
+        # scan. Postgres walks a B-tree backwards, so ascending (patient_id, <time>)
+        # indexes serve the DESC ordering of every per-patient history route.
+        Index("ix_handoffs_patient_shift", "patient_id", "shift_time"),
+        # Keep the heap row narrow: past 256 bytes (default ~2 KB) Postgres moves
+        # the agent output and transcript out of line into TOAST, so scans that
+        # don't select them (summaries, keyset pages, context) read small tuples.
+        # Existing database: ALTER TABLE handoffs SET (toast_tuple_target = 256);
+        {"postgresql_with": {"toast_tuple_target": 256}},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
     nurse_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    shift_time = Column(DateTime, nullable=False)
+    shift_time = Column(DateTime(timezone=True), nullable=False)
     audio_path = Column(String, nullable=True)
     raw_transcript = Column(String, nullable=True)
-    processed_at = Column(DateTime, nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
     agent_output_json = Column(JSONB, nullable=True) # Native Postgres JSONB
 
+    # Stored generated copies of the fields the patient-context read uses on every
+    # handoff — Postgres keeps them in sync on write, and the read never has to
+    # detoast and walk the full agent output. On an existing database:
+    #   ALTER TABLE handoffs ADD COLUMN ctx_chief_complaint TEXT GENERATED ALWAYS AS
+    #       (agent_output_json -> 'extracted' -> 'summary' ->> 'chief_complaint') STORED;
+    #   (and likewise for the other four, JSONB for the arrays)
+    # Deferred: whole-row Handoff loads (timeline, dashboard) don't pull the copies.
+    ctx_chief_complaint = deferred(Column(
+        Text, Computed("agent_output_json -> 'extracted' -> 'summary' ->> 'chief_complaint'", persisted=True)
+    ))
+    ctx_overall_risk = deferred(Column(
+        Text, Computed("agent_output_json -> 'risks' ->> 'overall_risk'", persisted=True)
+    ))
+    ctx_pending_tasks = deferred(Column(
+        JSONB, Computed("agent_output_json -> 'extracted' -> 'pending_tasks'", persisted=True)
+    ))
+    ctx_medications = deferred(Column(
+        JSONB, Computed("agent_output_json -> 'extracted' -> 'medications'", persisted=True)
+    ))
+    ctx_alerts = deferred(Column(
+        JSONB, Computed("agent_output_json -> 'risks' -> 'alerts'", persisted=True)
+    ))
+    # What the POST response and the summaries list show. jsonpath rather than
+    # ARRAY(SELECT ...) — generation expressions can't contain subqueries; lax mode
+    # clamps the [0 to 4] range on shorter arrays
+    top_alerts = deferred(Column(
+        JSONB,
+        Computed("jsonb_path_query_array(agent_output_json, '$.risks.alerts[0 to 4].alert_type')", persisted=True),
+    ))
+    narrative = deferred(Column(
+        Text, Computed("agent_output_json -> 'hinglish_summary' ->> 'patient_overview'", persisted=True)
+    ))
+
     # Relationships
     patient = relationship("Patient", back_populates="handoffs")
     nurse = relationship("User", back_populates="handoffs")
@@ -60,24 +137,30 @@ class Handoff(Base):
     vitals = relationship("VitalsHistory", back_populates="handoff")
 
 
-class MedicationHistory(Base):
+class MedicationHistory(BulkCreateMixin, Base):
     __tablename__ = "medications_history"
+    __table_args__ = (
+        Index("ix_meds_patient_shift", "patient_id", "shift_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     handoff_id = Column(Integer, ForeignKey("handoffs.id"), nullable=False)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
     med_name = Column(String, nullable=False)
     dose = Column(String, nullable=False)
-    time_given = Column(DateTime, nullable=True)
-    shift_date = Column(DateTime, nullable=False)
+    time_given = Column(DateTime(timezone=True), nullable=True)
+    shift_date = Column(DateTime(timezone=True), nullable=False)
 
     # Relationships
     patient = relationship("Patient", back_populates="medications")
     handoff = relationship("Handoff", back_populates="medications")
 
 
-class VitalsHistory(Base):
+class VitalsHistory(BulkCreateMixin, Base):
     __tablename__ = "vitals_history"
+    __table_args__ = (
+        Index("ix_vitals_patient_recorded", "patient_id", "recorded_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     handoff_id = Column(Integer, ForeignKey("handoffs.id"), nullable=False)
@@ -85,23 +168,37 @@ class VitalsHistory(Base):
     vital_type = Column(String, nullable=False) # e.g., BP, HR, Temp
     value = Column(String, nullable=False)      # String allows "120/80"
     trend = Column(String, nullable=True)
-    recorded_at = Column(DateTime, nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
 
     # Relationships
     patient = relationship("Patient", back_populates="vitals")
     handoff = relationship("Handoff", back_populates="vitals")
 
 
-class ActiveRisk(Base):
+# Native Postgres enum — the type itself rejects anything else, and the planner
+# can match `status = 'active'` against the partial index below
+RiskStatus = Enum("active", "resolved", name="risk_status")
+
+
+class ActiveRisk(BulkCreateMixin, Base):
     __tablename__ = "active_risks"
+    __table_args__ = (
+        # Partial — only active rows are ever listed, resolved ones pile up forever
+        Index(
+            "ix_risks_patient_active",
+            "patient_id",
+            "created_at",
+            postgresql_where=text("status = 'active'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
     risk_type = Column(String, nullable=False)
     severity = Column(String, nullable=False)
-    status = Column(String, default="active", nullable=False) # active or resolved
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    resolved_at = Column(DateTime, nullable=True)
+    status = Column(RiskStatus, default="active", nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    resolved_at = Column(DateTime(timezone=True), nullable=True)
 
     # Relationships
     patient = relationship("Patient", back_populates="risks")
@@ -0,0 +1,136 @@
+"""
+Hot per-patient read statements, built once at import.
+
+Routes execute them with bound values (`{"pid": ..., "lim": ...}`) instead of
+rebuilding the select() on every request; SQLAlchemy's compiled cache then
+serves the SQL string for each shape without recompiling.
+"""
+
+from typing import Any, Type
+
+from pydantic import BaseModel
+from sqlalchemy import DateTime, Integer, Select, bindparam, func, literal_column, select, tuple_
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by
+from sqlalchemy.orm import raiseload
+
+from app import models, schemas
+
+# raiseload("*") everywhere — the response schemas read plain columns only, so a
+# lazy load would be a bug (and, under asyncio, an error at an awkward place)
+
+PATIENT_HANDOFFS = (
+    select(models.Handoff)
+    .options(raiseload("*"))
+    .where(models.Handoff.patient_id == bindparam("pid"))
+    .order_by(models.Handoff.shift_time.desc(), models.Handoff.id.desc())
+    .limit(bindparam("lim", type_=Integer))
+)
+
+
+def _handoff_summaries(keyset: bool) -> Select:
+    # Column projection — raw_transcript and the agent_output blob are never read;
+    # risk level and top alerts come from their stored generated columns
+    stmt = (
+        select(
+            models.Handoff.id,
+            models.Handoff.patient_id,
+            models.Handoff.nurse_id,
+            models.Handoff.shift_time,
+            models.Handoff.processed_at,
+            models.Handoff.ctx_overall_risk.label("risk_level"),
+            models.Handoff.top_alerts,
+        )
+        .where(models.Handoff.patient_id == bindparam("pid"))
+        .order_by(models.Handoff.shift_time.desc(), models.Handoff.id.desc())
+        .limit(bindparam("lim", type_=Integer))
+    )
+    if keyset:
+        stmt = stmt.where(
+            tuple_(models.Handoff.shift_time, models.Handoff.id)
+            < tuple_(
+                bindparam("before_shift_time", type_=DateTime(timezone=True)),
+                bindparam("before_id", type_=Integer),
+            )
+        )
+    return stmt
+
+
+PATIENT_HANDOFF_SUMMARIES = _handoff_summaries(keyset=False)
+PATIENT_HANDOFF_SUMMARIES_BEFORE = _handoff_summaries(keyset=True)   # + before_shift_time, before_id
+
+PATIENT_VITALS = (
+    select(models.VitalsHistory)
+    .options(raiseload("*"))
+    .where(models.VitalsHistory.patient_id == bindparam("pid"))
+    .order_by(models.VitalsHistory.recorded_at.desc())
+    .limit(bindparam("lim", type_=Integer))
+)
+
+PATIENT_MEDICATIONS = (
+    select(models.MedicationHistory)
+    .options(raiseload("*"))
+    .where(models.MedicationHistory.patient_id == bindparam("pid"))
+    .order_by(models.MedicationHistory.shift_date.desc())
+    .limit(bindparam("lim", type_=Integer))
+)
+
+ACTIVE_RISKS = (
+    select(models.ActiveRisk)
+    .options(raiseload("*"))
+    .where(
+        models.ActiveRisk.patient_id == bindparam("pid"),
+        models.ActiveRisk.status == "active",
+    )
+    .order_by(models.ActiveRisk.created_at.desc())
+)
+
+
+# ── Dashboard — one statement, one round trip on the request's connection ────
+
+def _jsonb_rows(model: Any, schema: Type[BaseModel], *where: Any, order_by: Any, limit: int = 0) -> Any:
+    """
+    Scalar subquery: the newest rows of `model` as a JSONB array (newest first),
+    holding only the columns `schema` returns. '[]' when there are none.
+    """
+    page = select(*(getattr(model, name) for name in schema.model_fields)).where(*where)
+    page = page.order_by(*(c.desc() for c in order_by))
+    if limit:
+        page = page.limit(limit)
+    rows = page.subquery()
+    return (
+        select(
+            func.coalesce(
+                func.jsonb_agg(aggregate_order_by(rows.table_valued(), *(rows.c[c.key].desc() for c in order_by))),
+                literal_column("'[]'::jsonb"),
+                type_=JSONB,
+            )
+        )
+        .scalar_subquery()
+    )
+
+
+_pid = bindparam("pid", type_=Integer)
+
+PATIENT_DASHBOARD = select(
+    models.Patient,
+    _jsonb_rows(
+        models.ActiveRisk, schemas.ActiveRiskResponse,
+        models.ActiveRisk.patient_id == _pid, models.ActiveRisk.status == "active",
+        order_by=(models.ActiveRisk.created_at,),
+    ).label("active_risks"),
+    _jsonb_rows(
+        models.Handoff, schemas.HandoffResponse,
+        models.Handoff.patient_id == _pid,
+        order_by=(models.Handoff.shift_time, models.Handoff.id), limit=1,
+    ).label("latest_handoff"),
+    _jsonb_rows(
+        models.VitalsHistory, schemas.VitalsHistoryResponse,
+        models.VitalsHistory.patient_id == _pid,
+        order_by=(models.VitalsHistory.recorded_at,), limit=20,
+    ).label("recent_vitals"),
+    _jsonb_rows(
+        models.MedicationHistory, schemas.MedicationHistoryResponse,
+        models.MedicationHistory.patient_id == _pid,
+        order_by=(models.MedicationHistory.shift_date,), limit=20,
+    ).label("recent_medications"),
+).options(raiseload("*")).where(models.Patient.id == _pid)
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 
@@ -11,29 +13,39 @@ router = APIRouter(
     tags=["Authentication"]
 )
 
+# Password hashing is deliberately CPU-heavy — run it on the threadpool so it
+# doesn't stall the event loop for every other request
+
 @router.post("/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(models.User).where(models.User.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email is already registered")
     
-    hashed_pwd = auth.get_password_hash(user.password)
+    hashed_pwd = await run_in_threadpool(auth.get_password_hash, user.password)
     new_user = models.User(email=user.email, hashed_password=hashed_pwd)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @router.post("/login", response_model=schemas.Token)
-def login_for_access_token(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == user_credentials.email).first()
+async def login_for_access_token(user_credentials: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == user_credentials.email))
     
-    if not user or not auth.verify_password(user_credentials.password, user.hashed_password):
+    if not user or not await run_in_threadpool(
+        auth.verify_password, user_credentials.password, user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Migrate legacy bcrypt (or outdated argon2) hashes while we have the plaintext
+    if auth.password_needs_rehash(user.hashed_password):
+        user.hashed_password = await run_in_threadpool(auth.get_password_hash, user_credentials.password)
+        await db.commit()
     
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
@@ -1,25 +1,54 @@
 from __future__ import annotations
 
 import logging
-from typing import List
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Response, UploadFile, status
+from sqlalchemy import Text, cast, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import models, schemas, auth
+from app import models, queries, schemas, auth
 from app.database import get_db
-from app.services.handoff_service import HandoffService
+from app.services.handoff_service import handoff_service
 from app.services.transcription_service import transcription_service
 
 logger = logging.getLogger("backend.handoff_routes")
 
-ALLOWED_AUDIO_CONTENT_TYPES = {
+# Bare MIME types — parameters such as ";codecs=opus" are stripped before the check
+ALLOWED_AUDIO_CONTENT_TYPES = frozenset({
     "audio/wav",
     "audio/wave",
     "audio/x-wav",
     "audio/webm",
+    "video/webm",
     "audio/ogg",
+    "application/ogg",
+    "audio/mpeg",
+    "audio/mp3",
+    "audio/mp4",                 # Safari's MediaRecorder default
+    "audio/x-m4a",               # .m4a files picked on macOS / in Chrome
+    "audio/m4a",
+    "audio/aac",
+    "audio/x-aac",
     "application/octet-stream",  # some browsers send this for wav blobs
+})
+
+_AUDIO_SUFFIXES = frozenset({".wav", ".webm", ".ogg", ".mp3", ".m4a", ".aac"})
+_CONTENT_TYPE_SUFFIX = {
+    "audio/webm": ".webm",
+    "video/webm": ".webm",   # MediaRecorder on some browsers labels audio-only webm as video
+    "audio/ogg": ".ogg",
+    "application/ogg": ".ogg",
+    "audio/mpeg": ".mp3",
+    "audio/mp3": ".mp3",
+    "audio/mp4": ".m4a",
+    "audio/x-m4a": ".m4a",
+    "audio/m4a": ".m4a",
+    "audio/aac": ".aac",
+    "audio/x-aac": ".aac",
 }
 
 router = APIRouter(prefix="/api/handoffs", tags=["Handoffs"])
@@ -33,12 +62,12 @@ router = APIRouter(prefix="/api/handoffs", tags=["Handoffs"])
 )
 async def process_handoff(
     body: schemas.HandoffProcessRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> schemas.HandoffSummaryResponse:
-    service = HandoffService(db)
     try:
-        result = await service.process(
+        result = await handoff_service.process(
+            db,
             patient_id=body.patient_id,
             nurse_id=current_user.id,
             transcript=body.transcript,
@@ -71,25 +100,25 @@ async def upload_audio_handoff(
     audio: UploadFile = File(..., description="WAV or WebM audio recording"),
     patient_id: int = Form(...),
     handoff_time: str = Form("07:00 AM"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> schemas.HandoffSummaryResponse:
-    audio_bytes = await audio.read()
-    if not audio_bytes:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Uploaded audio file is empty.",
-        )
+    audio_size = _validated_upload_size(audio)
 
     suffix = _audio_suffix(audio.content_type, audio.filename)
 
     logger.info(
         "Audio upload | patient_id=%d | filename=%s | content_type=%s | bytes=%d",
-        patient_id, audio.filename, audio.content_type, len(audio_bytes),
+        patient_id, audio.filename, audio.content_type, audio_size,
     )
 
+    # End the read transaction auth opened — otherwise its pooled connection sits
+    # "idle in transaction" for the whole STT run (expire_on_commit=False keeps
+    # current_user loaded)
+    await db.commit()
+
     try:
-        transcript = await transcription_service.transcribe(audio_bytes, suffix=suffix)
+        transcript = await transcription_service.transcribe(audio.file, suffix=suffix)
     except RuntimeError as exc:
         logger.exception("Transcription failed: %s", exc)
         raise HTTPException(
@@ -105,9 +134,9 @@ async def upload_audio_handoff(
 
     logger.info("Transcript obtained | chars=%d | preview=%.80r", len(transcript), transcript)
 
-    service = HandoffService(db)
     try:
-        result = await service.process(
+        result = await handoff_service.process(
+            db,
             patient_id=patient_id,
             nurse_id=current_user.id,
             transcript=transcript,
@@ -133,20 +162,18 @@ async def upload_audio_handoff(
 )
 async def transcribe_only(
     audio: UploadFile = File(..., description="WAV or WebM audio recording"),
+    db: AsyncSession = Depends(get_db),   # same session auth used — released below
     current_user: models.User = Depends(auth.get_current_user),
 ) -> schemas.TranscriptResponse:
     """Preview-before-submit: returns the transcript so the user can edit it before sending to the agent."""
-    audio_bytes = await audio.read()
-    if not audio_bytes:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Uploaded audio file is empty.",
-        )
+    audio_size = _validated_upload_size(audio)
 
     suffix = _audio_suffix(audio.content_type, audio.filename)
 
+    await db.commit()   # release auth's connection before the long STT await
+
     try:
-        transcript = await transcription_service.transcribe(audio_bytes, suffix=suffix)
+        transcript = await transcription_service.transcribe(audio.file, suffix=suffix)
     except RuntimeError as exc:
         logger.exception("Transcription failed: %s", exc)
         raise HTTPException(
@@ -157,19 +184,44 @@ async def transcribe_only(
     return schemas.TranscriptResponse(transcript=transcript)
 
 
+def _bare_mime(content_type: str | None) -> str:
+    return (content_type or "").partition(";")[0].strip().lower()   # drop ";codecs=opus"
+
+
+def _validated_upload_size(audio: UploadFile) -> int:
+    """
+    Reject unsupported types (415) and empty uploads (400) before the spooled
+    file is copied anywhere. An unlisted content type still passes when the
+    filename has a known audio extension — browsers label the same file many
+    ways. Returns the upload size in bytes.
+    """
+    mime = _bare_mime(audio.content_type) or "application/octet-stream"
+    ext = Path(audio.filename).suffix.lower() if audio.filename else ""
+    if mime not in ALLOWED_AUDIO_CONTENT_TYPES and ext not in _AUDIO_SUFFIXES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported audio content type: {mime}",
+        )
+
+    size = audio.size   # counted by the multipart parser while spooling
+    if size is None:
+        audio.file.seek(0, os.SEEK_END)
+        size = audio.file.tell()
+        audio.file.seek(0)
+    if not size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded audio file is empty.",
+        )
+    return size
+
+
 def _audio_suffix(content_type: str | None, filename: str | None) -> str:
-    """Derive a file suffix from MIME type or original filename, defaulting to .wav."""
-    if filename:
-        from pathlib import Path
-        ext = Path(filename).suffix.lower()
-        if ext in {".wav", ".webm", ".ogg", ".mp3", ".m4a"}:
-            return ext
-    ct = (content_type or "").lower()
-    if "webm" in ct:
-        return ".webm"
-    if "ogg" in ct:
-        return ".ogg"
-    return ".wav"
+    """Derive a file suffix from original filename or MIME type, defaulting to .wav."""
+    ext = Path(filename).suffix.lower() if filename else ""
+    if ext in _AUDIO_SUFFIXES:
+        return ext
+    return _CONTENT_TYPE_SUFFIX.get(_bare_mime(content_type), ".wav")
 
 
 @router.get(
@@ -177,20 +229,49 @@ def _audio_suffix(content_type: str | None, filename: str | None) -> str:
     response_model=List[schemas.HandoffResponse],
     summary="Get all handoffs for a patient, newest first.",
 )
-def get_patient_handoffs(
+async def get_patient_handoffs(
     patient_id: int,
     limit: int = 10,
-    db: Session = Depends(get_db),
+    before_shift_time: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> List[schemas.HandoffResponse]:
-    rows = (
-        db.query(models.Handoff)
-        .filter(models.Handoff.patient_id == patient_id)
-        .order_by(models.Handoff.shift_time.desc())
-        .limit(limit)
-        .all()
-    )
-    return rows
+    """
+    Keyset pagination — pass the shift_time and id of the last row of a page as
+    before_shift_time/before_id to get the next one. Stays an index range scan
+    on (patient_id, shift_time) however deep the page, unlike OFFSET.
+    """
+    stmt = queries.PATIENT_HANDOFFS
+    if before_shift_time is not None and before_id is not None:
+        stmt = stmt.where(
+            tuple_(models.Handoff.shift_time, models.Handoff.id) < (before_shift_time, before_id)
+        )
+    rows = await db.scalars(stmt, {"pid": patient_id, "lim": limit})
+    return rows.all()
+
+
+@router.get(
+    "/patient/{patient_id}/summaries",
+    response_model=List[schemas.HandoffSummary],
+    summary="Handoff metadata for a patient (no transcript/agent output), newest first.",
+)
+async def get_patient_handoff_summaries(
+    patient_id: int,
+    limit: int = 50,
+    before_shift_time: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+) -> List[schemas.HandoffSummary]:
+    """Same ordering and keyset cursor as /patient/{id}, without the large columns."""
+    params: Dict[str, Any] = {"pid": patient_id, "lim": limit}
+    stmt = queries.PATIENT_HANDOFF_SUMMARIES
+    if before_shift_time is not None and before_id is not None:
+        stmt = queries.PATIENT_HANDOFF_SUMMARIES_BEFORE
+        params.update(before_shift_time=before_shift_time, before_id=before_id)
+    rows = await db.execute(stmt, params)
+    return rows.all()
 
 
 @router.get(
@@ -198,12 +279,31 @@ def get_patient_handoffs(
     response_model=schemas.HandoffResponse,
     summary="Get a single handoff by ID.",
 )
-def get_handoff(
+async def get_handoff(
     handoff_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> schemas.HandoffResponse:
-    row = db.query(models.Handoff).filter(models.Handoff.id == handoff_id).first()
+    row = await db.get(models.Handoff, handoff_id)
     if not row:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Handoff not found")
     return row
+
+
+@router.get(
+    "/{handoff_id}/analysis",
+    summary="Full agent output for a handoff (what the process routes no longer inline).",
+)
+async def get_handoff_analysis(
+    handoff_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+) -> Response:
+    # Postgres renders the JSONB as text and the bytes go out as-is — no decode
+    # into Python objects and re-encode on the way through
+    body = await db.scalar(
+        select(cast(models.Handoff.agent_output_json, Text)).where(models.Handoff.id == handoff_id)
+    )
+    if body is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Handoff analysis not found")
+    return Response(content=body, media_type="application/json")
@@ -1,18 +1,23 @@
 from __future__ import annotations
 
 import logging
-from typing import List
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import models, schemas, auth
-from app.database import get_db
+from app import models, queries, schemas, auth
+from app.database import AsyncSessionLocal, get_db
 
 logger = logging.getLogger("backend.patient_routes")
 
 router = APIRouter(prefix="/api/patients", tags=["Patients"])
 
+_STREAM_BATCH_SIZE = 500   # rows per server-side cursor fetch
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # CRUD
@@ -24,15 +29,15 @@ router = APIRouter(prefix="/api/patients", tags=["Patients"])
     status_code=status.HTTP_201_CREATED,
     summary="Register a new patient.",
 )
-def create_patient(
+async def create_patient(
     patient: schemas.PatientCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> schemas.PatientResponse:
     new_patient = models.Patient(**patient.model_dump())
     db.add(new_patient)
-    db.commit()
-    db.refresh(new_patient)
+    await db.commit()
+    await db.refresh(new_patient)
     logger.info("Patient created | id=%d | name=%s", new_patient.id, new_patient.name)
     return new_patient
 
@@ -42,11 +47,49 @@ def create_patient(
     response_model=List[schemas.PatientResponse],
     summary="List all patients.",
 )
-def list_patients(
-    db: Session = Depends(get_db),
+async def list_patients(
+    limit: Optional[int] = None,
+    before_created_at: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> List[schemas.PatientResponse]:
-    return db.query(models.Patient).order_by(models.Patient.created_at.desc()).all()
+    """
+    Newest first. Without `limit` every patient is returned (what the ward list
+    uses); with it, page on by passing the last row's created_at/id as
+    before_created_at/before_id.
+    """
+    stmt = select(models.Patient).order_by(models.Patient.created_at.desc(), models.Patient.id.desc())
+    if before_created_at is not None and before_id is not None:
+        stmt = stmt.where(
+            tuple_(models.Patient.created_at, models.Patient.id) < (before_created_at, before_id)
+        )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await db.scalars(stmt)
+    return result.all()
+
+
+# Declared before /{patient_id} so "stream" isn't taken for an ID
+@router.get(
+    "/stream",
+    summary="All patients as NDJSON, newest first — streamed from a server-side cursor.",
+)
+async def stream_patients(
+    current_user: models.User = Depends(auth.get_current_user),
+) -> StreamingResponse:
+    async def ndjson() -> AsyncIterator[bytes]:
+        # Own session: the rows are produced after the endpoint has returned
+        async with AsyncSessionLocal() as session:
+            rows = await session.stream_scalars(
+                select(models.Patient)
+                .order_by(models.Patient.created_at.desc(), models.Patient.id.desc())
+                .execution_options(yield_per=_STREAM_BATCH_SIZE)
+            )
+            async for patient in rows:
+                yield schemas.PatientResponse.model_validate(patient).model_dump_json().encode() + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 
 @router.get(
@@ -54,12 +97,12 @@ def list_patients(
     response_model=schemas.PatientResponse,
     summary="Get a patient by ID.",
 )
-def get_patient(
+async def get_patient(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> schemas.PatientResponse:
-    patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    patient = await db.get(models.Patient, patient_id)
     if not patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
     return patient
@@ -70,21 +113,21 @@ def get_patient(
     response_model=schemas.PatientResponse,
     summary="Update patient details (partial update supported).",
 )
-def update_patient(
+async def update_patient(
     patient_id: int,
     updates: schemas.PatientUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> schemas.PatientResponse:
-    patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    patient = await db.get(models.Patient, patient_id)
     if not patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
 
     for field, value in updates.model_dump(exclude_none=True).items():
         setattr(patient, field, value)
 
-    db.commit()
-    db.refresh(patient)
+    await db.commit()
+    await db.refresh(patient)
     return patient
 
 
@@ -97,53 +140,26 @@ def update_patient(
     response_model=schemas.PatientDashboard,
     summary="Full patient dashboard: latest handoff, active risks, recent vitals & meds.",
 )
-def get_patient_dashboard(
+async def get_patient_dashboard(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> schemas.PatientDashboard:
-    patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
-    if not patient:
+    # One statement on the request's own connection: the patient row, with the
+    # active risks and the three top-N lists aggregated to JSONB arrays by
+    # Postgres in scalar subqueries — one round trip, one pooled connection
+    row = (await db.execute(queries.PATIENT_DASHBOARD, {"pid": patient_id})).one_or_none()
+    if row is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
 
-    latest_handoff = (
-        db.query(models.Handoff)
-        .filter(models.Handoff.patient_id == patient_id)
-        .order_by(models.Handoff.shift_time.desc())
-        .first()
-    )
-
-    active_risks = (
-        db.query(models.ActiveRisk)
-        .filter(
-            models.ActiveRisk.patient_id == patient_id,
-            models.ActiveRisk.status == "active",
-        )
-        .all()
-    )
-
-    recent_vitals = (
-        db.query(models.VitalsHistory)
-        .filter(models.VitalsHistory.patient_id == patient_id)
-        .order_by(models.VitalsHistory.recorded_at.desc())
-        .limit(20)
-        .all()
-    )
-
-    recent_medications = (
-        db.query(models.MedicationHistory)
-        .filter(models.MedicationHistory.patient_id == patient_id)
-        .order_by(models.MedicationHistory.shift_date.desc())
-        .limit(20)
-        .all()
-    )
-
     return schemas.PatientDashboard(
-        patient=schemas.PatientResponse.model_validate(patient),
-        latest_handoff=schemas.HandoffResponse.model_validate(latest_handoff) if latest_handoff else None,
-        active_risks=[schemas.ActiveRiskResponse.model_validate(r) for r in active_risks],
-        recent_vitals=[schemas.VitalsHistoryResponse.model_validate(v) for v in recent_vitals],
-        recent_medications=[schemas.MedicationHistoryResponse.model_validate(m) for m in recent_medications],
+        patient=schemas.PatientResponse.model_validate(row.Patient),
+        latest_handoff=(
+            schemas.HandoffResponse.model_validate(row.latest_handoff[0]) if row.latest_handoff else None
+        ),
+        active_risks=schemas.ActiveRiskListAdapter.validate_python(row.active_risks),
+        recent_vitals=schemas.VitalsListAdapter.validate_python(row.recent_vitals),
+        recent_medications=schemas.MedicationListAdapter.validate_python(row.recent_medications),
     )
 
 
@@ -156,19 +172,14 @@ def get_patient_dashboard(
     response_model=List[schemas.VitalsHistoryResponse],
     summary="Vitals history for a patient.",
 )
-def get_patient_vitals(
+async def get_patient_vitals(
     patient_id: int,
     limit: int = 50,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> List[schemas.VitalsHistoryResponse]:
-    return (
-        db.query(models.VitalsHistory)
-        .filter(models.VitalsHistory.patient_id == patient_id)
-        .order_by(models.VitalsHistory.recorded_at.desc())
-        .limit(limit)
-        .all()
-    )
+    result = await db.scalars(queries.PATIENT_VITALS, {"pid": patient_id, "lim": limit})
+    return result.all()
 
 
 @router.get(
@@ -176,19 +187,14 @@ def get_patient_vitals(
     response_model=List[schemas.MedicationHistoryResponse],
     summary="Medication history for a patient.",
 )
-def get_patient_medications(
+async def get_patient_medications(
     patient_id: int,
     limit: int = 50,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> List[schemas.MedicationHistoryResponse]:
-    return (
-        db.query(models.MedicationHistory)
-        .filter(models.MedicationHistory.patient_id == patient_id)
-        .order_by(models.MedicationHistory.shift_date.desc())
-        .limit(limit)
-        .all()
-    )
+    result = await db.scalars(queries.PATIENT_MEDICATIONS, {"pid": patient_id, "lim": limit})
+    return result.all()
 
 
 @router.get(
@@ -196,17 +202,10 @@ def get_patient_medications(
     response_model=List[schemas.ActiveRiskResponse],
     summary="Active risks for a patient.",
 )
-def get_patient_risks(
+async def get_patient_risks(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),
 ) -> List[schemas.ActiveRiskResponse]:
-    return (
-        db.query(models.ActiveRisk)
-        .filter(
-            models.ActiveRisk.patient_id == patient_id,
-            models.ActiveRisk.status == "active",
-        )
-        .order_by(models.ActiveRisk.created_at.desc())
-        .all()
-    )
+    result = await db.scalars(queries.ACTIVE_RISKS, {"pid": patient_id})
+    return result.all()
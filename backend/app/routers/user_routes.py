@@ -7,5 +7,5 @@ router = APIRouter(
 )
 
 @router.get("/me", response_model=schemas.UserResponse)
-def read_current_user(current_user: models.User = Depends(auth.get_current_user)):
+async def read_current_user(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
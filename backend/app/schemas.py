@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, TypeAdapter
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -19,7 +19,7 @@ class UserResponse(BaseModel):
     id: int
     email: EmailStr
 
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 class Token(BaseModel):
@@ -75,7 +75,7 @@ class PatientResponse(BaseModel):
     allergies: Optional[List[str]]
     created_at: datetime
 
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -102,7 +102,23 @@ class HandoffResponse(BaseModel):
     agent_output_json: Optional[Dict[str, Any]]
     processed_at: Optional[datetime]
 
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
+
+
+class HandoffSummary(BaseModel):
+    """
+    Handoff metadata for list views that don't render the transcript or full
+    agent output. risk_level/top_alerts come from stored generated columns.
+    """
+    id: int
+    patient_id: int
+    nurse_id: int
+    shift_time: datetime
+    processed_at: Optional[datetime]
+    risk_level: Optional[str] = None          # risks.overall_risk
+    top_alerts: Optional[List[str]] = None    # first 5 risks.alerts[*].alert_type
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 class HandoffSummaryResponse(BaseModel):
@@ -112,8 +128,7 @@ class HandoffSummaryResponse(BaseModel):
     patient_name: str
     risk_level: str                  # overall_risk from agent
     top_alerts: List[str]            # alert_type strings from risks.alerts
-    hinglish_narrative: str          
-    full_analysis: Dict[str, Any]    
+    hinglish_narrative: str          # full agent output: GET /api/handoffs/{id}/analysis
 
 
 class HandoffProcessRequest(BaseModel):
@@ -150,7 +165,7 @@ class MedicationHistoryResponse(BaseModel):
     time_given: Optional[datetime]
     shift_date: datetime
 
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -166,7 +181,7 @@ class VitalsHistoryResponse(BaseModel):
     trend: Optional[str]
     recorded_at: datetime
 
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -182,7 +197,7 @@ class ActiveRiskResponse(BaseModel):
     created_at: datetime
     resolved_at: Optional[datetime]
 
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -196,3 +211,13 @@ class PatientDashboard(BaseModel):
     active_risks: List[ActiveRiskResponse]
     recent_vitals: List[VitalsHistoryResponse]
     recent_medications: List[MedicationHistoryResponse]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# List adapters — validate a whole list of ORM rows in one core-schema call
+# instead of a model_validate per row
+# ─────────────────────────────────────────────────────────────────────────────
+
+ActiveRiskListAdapter = TypeAdapter(List[ActiveRiskResponse])
+VitalsListAdapter = TypeAdapter(List[VitalsHistoryResponse])
+MedicationListAdapter = TypeAdapter(List[MedicationHistoryResponse])
@@ -1,15 +1,45 @@
 """HTTP client for communicating with the Agent service (port 8001)."""
 
+import asyncio
+import copy
+import hashlib
+import importlib.util
 import os
 import logging
-from typing import Optional
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 
 import httpx
+import orjson
 
 logger = logging.getLogger("backend.agent_client")
 
 AGENT_SERVICE_URL: str = os.getenv("AGENT_SERVICE_URL", "http://localhost:8001")
 AGENT_TIMEOUT_SECONDS: int = int(os.getenv("AGENT_TIMEOUT_SECONDS", "120"))
+# Handoffs sent to the agent at once; a burst beyond this queues here instead of
+# piling onto the agent's LLM calls and slowing every request down together
+AGENT_MAX_CONCURRENCY: int = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+# Multiplex calls over HTTP/2 when the agent sits behind an h2-capable TLS proxy
+# (uvicorn itself only speaks HTTP/1.1). Needs the `h2` package (httpx[http2]).
+AGENT_HTTP2: bool = os.getenv("AGENT_HTTP2") == "1"
+# Exact-input result cache — a resubmitted handoff (same transcript, context and
+# shift time) reuses the earlier AgentOutput instead of rerunning the pipeline.
+# 0 disables it.
+AGENT_CACHE_TTL_SECONDS: float = float(os.getenv("AGENT_CACHE_TTL_SECONDS", "3600"))
+_AGENT_CACHE_MAX_SIZE = 1024
+
+
+class _Preview:
+    """Log arg for the first 100 chars of a string on one line — only built if the record is emitted."""
+
+    __slots__ = ("_text",)
+
+    def __init__(self, text: str) -> None:
+        self._text = text
+
+    def __repr__(self) -> str:
+        return repr(self._text[:100].replace("\n", " "))
 
 
 class AgentClient:
@@ -17,6 +47,60 @@ class AgentClient:
 
     def __init__(self) -> None:
         self._base_url = AGENT_SERVICE_URL
+        # One pooled client for the process — keep-alive sockets are reused
+        # across handoffs instead of reconnecting on every call
+        self._client = httpx.AsyncClient(
+            base_url=AGENT_SERVICE_URL,
+            timeout=AGENT_TIMEOUT_SECONDS,
+            http2=AGENT_HTTP2 and self._h2_available(),
+            # Sized to the semaphore — never more sockets than calls allowed in flight
+            limits=httpx.Limits(
+                max_connections=AGENT_MAX_CONCURRENCY,
+                max_keepalive_connections=AGENT_MAX_CONCURRENCY,
+                keepalive_expiry=60,
+            ),
+        )
+        self._sem = asyncio.Semaphore(AGENT_MAX_CONCURRENCY)
+        # key -> (AgentOutput dict, expires_at); only touched on the event loop
+        self._cache: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+
+    @staticmethod
+    def _h2_available() -> bool:
+        if importlib.util.find_spec("h2") is None:
+            logger.warning("AGENT_HTTP2=1 but the h2 package is missing; using HTTP/1.1")
+            return False
+        return True
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    @staticmethod
+    def _cache_key(payload: dict) -> bytes:
+        h = hashlib.sha256()
+        for field in ("transcript", "patient_context", "handoff_time"):
+            h.update(payload[field].encode())
+            h.update(b"\0")   # field separator, so ("ab", "c") != ("a", "bc")
+        return h.digest()
+
+    def _cached(self, key: bytes) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return copy.deepcopy(data)   # callers get their own copy to mutate
+
+    def _store(self, key: bytes, data: dict) -> None:
+        # A degraded result carries empty risk/omission layers — caching it would
+        # replay that empty assessment to every resubmission until the TTL ran out
+        if AGENT_CACHE_TTL_SECONDS <= 0 or data.get("degraded_layers"):
+            return
+        if len(self._cache) >= _AGENT_CACHE_MAX_SIZE:
+            self._cache.popitem(last=False)   # least recently used
+        self._cache[key] = (copy.deepcopy(data), time.monotonic() + AGENT_CACHE_TTL_SECONDS)
 
     async def call_extract(
         self,
@@ -35,28 +119,34 @@ class AgentClient:
             "handoff_time": handoff_time,
             "patient_context": patient_context or "",
         }
-        context_preview = (patient_context or "")[:100].replace("\n", " ")
+        key = self._cache_key(payload)
+        cached = self._cached(key)
+        if cached is not None:
+            logger.info("Agent cache hit | transcript_len=%d", len(transcript))
+            return cached
+
         logger.info(
             "Calling Agent | url=%s/api/v1/extract | transcript_len=%d | context_len=%d | context_preview=%r",
             self._base_url,
             len(transcript),
             len(patient_context or ""),
-            context_preview,
+            _Preview(patient_context or ""),
         )
 
-        async with httpx.AsyncClient(timeout=AGENT_TIMEOUT_SECONDS) as client:
-            response = await client.post(
-                f"{self._base_url}/api/v1/extract",
+        async with self._sem:
+            response = await self._client.post(
+                "/api/v1/extract",   # whole AgentOutput; /extract/stream is the NDJSON variant
                 json=payload,
             )
-            response.raise_for_status()
-            data: dict = response.json()
-            logger.info(
-                "Agent response received | overall_risk=%s | ms=%s",
-                data.get("risks", {}).get("overall_risk", "unknown"),
-                data.get("processing_time_ms", "?"),
-            )
-            return data
+        response.raise_for_status()
+        data: dict = orjson.loads(response.content)   # faster than response.json()'s stdlib decode
+        logger.info(
+            "Agent response received | overall_risk=%s | ms=%s",
+            data.get("risks", {}).get("overall_risk", "unknown"),
+            data.get("processing_time_ms", "?"),
+        )
+        self._store(key, data)
+        return data
 
 
 # Module-level singleton — import and use directly
@@ -3,9 +3,10 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import models
 from app.services import agent_client
@@ -13,11 +14,66 @@ from app.services import agent_client
 logger = logging.getLogger("backend.handoff_service")
 
 
-class HandoffService:
-    """Single-responsibility service for processing a nurse handoff."""
+# Built once — only the bound values change per call. The patient row and its
+# last-N handoff context come back in one round trip; the LEFT JOIN keeps the
+# patient row (with NULL context columns) when there is no history yet. The
+# ctx_* columns are stored generated copies of the JSONB paths (see models.Handoff).
+_PATIENT_CONTEXT_SQL = text("""
+    SELECT
+        p.name,
+        ctx.shift_time,
+        ctx.chief_complaint,
+        ctx.overall_risk,
+        ctx.pending_tasks,
+        ctx.medications,
+        ctx.alerts
+    FROM patients p
+    LEFT JOIN LATERAL (
+        SELECT
+            shift_time,
+            ctx_chief_complaint  AS chief_complaint,
+            ctx_overall_risk     AS overall_risk,
+            ctx_pending_tasks    AS pending_tasks,
+            ctx_medications      AS medications,
+            ctx_alerts           AS alerts
+        FROM handoffs
+        WHERE patient_id = p.id
+          AND agent_output_json IS NOT NULL
+        ORDER BY shift_time DESC
+        LIMIT :lim
+    ) ctx ON true
+    WHERE p.id = :pid
+    ORDER BY ctx.shift_time DESC
+""")
+
+
+_ROW_TMPL = "[Shift {shift}] Complaint: {complaint} | Risk: {risk}{meds}{pending}{alerts}"
+
+
+def _format_context_row(row: Any) -> str:
+    """One shift's paragraph of patient context; optional lines are skipped when empty."""
+    # medications — array of {name, dose, time_given}
+    med_names = [m.get("name", "") for m in row.medications or [] if m.get("name")]
+    # pending tasks — stored as a JSON array of strings
+    pending: List[str] = row.pending_tasks or []
+    # top alert types (max 3 to keep context short)
+    alert_types = [a.get("alert_type", "") for a in (row.alerts or [])[:3] if a.get("alert_type")]
+
+    return _ROW_TMPL.format(
+        shift=row.shift_time.strftime("%Y-%m-%d %H:%M") if row.shift_time else "?",
+        complaint=row.chief_complaint or "unknown complaint",
+        risk=row.overall_risk or "UNKNOWN",
+        meds=f"\n  Medications on that shift: {', '.join(med_names)}" if med_names else "",
+        pending=f"\n  Pending tasks carried forward: {'; '.join(pending)}" if pending else "",
+        alerts=f"\n  Alerts flagged: {', '.join(alert_types)}" if alert_types else "",
+    )
+
 
-    def __init__(self, db: Session) -> None:
-        self._db = db
+class HandoffService:
+    """
+    Single-responsibility service for processing a nurse handoff.
+    Stateless — one module-level instance; the request's session is passed per call.
+    """
 
     # ──────────────────────────────────────────────────────────────────────
     # Public interface
@@ -25,18 +81,21 @@ class HandoffService:
 
     async def process(
         self,
+        db: AsyncSession,
         patient_id: int,
         nurse_id: int,
         transcript: str,
         handoff_time: str,
         audio_path: Optional[str] = None,
     ) -> Dict[str, Any]:
-        patient = self._get_patient_or_raise(patient_id)
-        patient_context = self._build_patient_context(patient_id)
+        patient_name, patient_context = await self._load_patient_context(db, patient_id)
+        # The agent call takes seconds — end the read transaction so its pooled
+        # connection isn't held idle meanwhile; _persist checks out a fresh one
+        await db.commit()
 
         logger.info(
             "Processing handoff | patient=%s | nurse_id=%d | transcript_len=%d | context=%r",
-            patient.name,
+            patient_name,
             nurse_id,
             len(transcript),
             patient_context,
@@ -48,7 +107,8 @@ class HandoffService:
             patient_context=patient_context,
         )
 
-        handoff_id = self._persist(
+        handoff = await self._persist(
+            db,
             patient_id=patient_id,
             nurse_id=nurse_id,
             transcript=transcript,
@@ -57,8 +117,8 @@ class HandoffService:
         )
 
         return self._build_response(
-            handoff_id=handoff_id,
-            patient_name=patient.name,
+            handoff=handoff,
+            patient_name=patient_name,
             agent_output=agent_output,
         )
 
@@ -66,189 +126,170 @@ class HandoffService:
     # Private helpers
     # ──────────────────────────────────────────────────────────────────────
 
-    def _get_patient_or_raise(self, patient_id: int) -> models.Patient:
-        patient = self._db.query(models.Patient).filter(models.Patient.id == patient_id).first()
-        if not patient:
-            raise ValueError(f"Patient {patient_id} not found")
-        return patient
-
-
-    def _build_patient_context(self, patient_id: int, limit: int = 5) -> str:
+    async def _load_patient_context(
+        self, db: AsyncSession, patient_id: int, limit: int = 5
+    ) -> Tuple[str, str]:
         """
-        Build a concise context string from the last `limit` handoffs.
+        Return the patient's name and a concise context string built from the
+        last `limit` handoffs, in a single query.
 
-        Uses JSONB path operators so Postgres returns only the 5 fields we need
-        instead of loading the entire agent_output blob into Python memory.
-        Limit=2 means ~2 shift-summaries; each produces ~1 short paragraph of context.
+        Reads the generated ctx_* columns, so neither Postgres nor Python has
+        to load the entire agent_output blob.
+        Raises ValueError if the patient does not exist.
         """
-        from sqlalchemy import text
-
-        sql = text("""
-            SELECT
-                shift_time,
-                agent_output_json -> 'extracted' -> 'summary' ->> 'chief_complaint'  AS chief_complaint,
-                agent_output_json -> 'risks'     ->> 'overall_risk'                  AS overall_risk,
-                agent_output_json -> 'extracted' -> 'pending_tasks'                  AS pending_tasks,
-                agent_output_json -> 'extracted' -> 'medications'                    AS medications,
-                agent_output_json -> 'risks'     -> 'alerts'                         AS alerts
-            FROM handoffs
-            WHERE patient_id = :pid
-              AND agent_output_json IS NOT NULL
-            ORDER BY shift_time DESC
-            LIMIT :lim
-        """)
-
-        rows = self._db.execute(sql, {"pid": patient_id, "lim": limit}).fetchall()
+        rows = (await db.execute(_PATIENT_CONTEXT_SQL, {"pid": patient_id, "lim": limit})).fetchall()
 
         if not rows:
-            return "No previous handoff data."
-
-        parts: List[str] = []
-        for row in rows:
-            shift_str   = row.shift_time.strftime("%Y-%m-%d %H:%M") if row.shift_time else "?"
-            complaint   = row.chief_complaint or "unknown complaint"
-            risk        = row.overall_risk or "UNKNOWN"
-
-            # pending tasks — stored as a JSON array of strings
-            pending: List[str] = row.pending_tasks or []
-
-            # medications — array of {name, dose, time_given}
-            meds_raw: List[dict] = row.medications or []
-            med_names = [m.get("name", "") for m in meds_raw if m.get("name")]
-
-            # top alert types (max 3 to keep context short)
-            alerts_raw: List[dict] = row.alerts or []
-            alert_types = [a.get("alert_type", "") for a in alerts_raw[:3] if a.get("alert_type")]
-
-            lines = [f"[Shift {shift_str}] Complaint: {complaint} | Risk: {risk}"]
-            if med_names:
-                lines.append(f"  Medications on that shift: {', '.join(med_names)}")
-            if pending:
-                lines.append(f"  Pending tasks carried forward: {'; '.join(pending)}")
-            if alert_types:
-                lines.append(f"  Alerts flagged: {', '.join(alert_types)}")
+            raise ValueError(f"Patient {patient_id} not found")
+        patient_name: str = rows[0].name
+        history = [row for row in rows if row.shift_time is not None]
 
-            parts.append("\n".join(lines))
+        if not history:
+            return patient_name, "No previous handoff data."
 
-        context = "\n\n".join(parts)
+        context = "\n\n".join(_format_context_row(row) for row in history)
         logger.debug("Patient context built | patient_id=%d | chars=%d", patient_id, len(context))
-        return context
+        return patient_name, context
 
 
-    def _persist(
+    async def _persist(
         self,
+        db: AsyncSession,
         patient_id: int,
         nurse_id: int,
         transcript: str,
         audio_path: Optional[str],
         agent_output: Dict[str, Any],
-    ) -> int:
-        """Save handoff + denormalized meds/vitals/risks. Returns new handoff ID."""
+    ) -> Row:
+        """
+        Save handoff + denormalized meds/vitals/risks. Returns the new handoff's
+        (id, top_alerts, narrative) — the generated columns come back on RETURNING.
+        """
         now = datetime.now(timezone.utc)
 
-        handoff = models.Handoff(
-            patient_id=patient_id,
-            nurse_id=nurse_id,
-            shift_time=now,
-            audio_path=audio_path,
-            raw_transcript=transcript,
-            agent_output_json=agent_output,
-            processed_at=now,
-        )
-        self._db.add(handoff)
-        self._db.flush()  # get handoff.id without committing yet
+        # Core INSERT ... RETURNING id — write-only, so no ORM instance to track
+        handoff = (await db.execute(
+            insert(models.Handoff)
+            .values(
+                patient_id=patient_id,
+                nurse_id=nurse_id,
+                shift_time=now,
+                audio_path=audio_path,
+                raw_transcript=transcript,
+                agent_output_json=agent_output,
+                processed_at=now,
+            )
+            .returning(models.Handoff.id, models.Handoff.top_alerts, models.Handoff.narrative)
+        )).one()
+        handoff_id: int = handoff.id
 
-        self._save_medications(handoff.id, patient_id, agent_output, now)
-        self._save_vitals(handoff.id, patient_id, agent_output, now)
-        self._upsert_active_risks(patient_id, agent_output, now)
+        await self._save_medications(db, handoff_id, patient_id, agent_output, now)
+        await self._save_vitals(db, handoff_id, patient_id, agent_output, now)
+        await self._upsert_active_risks(db, patient_id, agent_output, now)
 
-        self._db.commit()
-        logger.info("Handoff persisted | handoff_id=%d | patient_id=%d", handoff.id, patient_id)
-        return handoff.id
+        await db.commit()   # handoff + all child rows in one transaction
+        logger.info("Handoff persisted | handoff_id=%d | patient_id=%d", handoff_id, patient_id)
+        return handoff
 
-    def _save_medications(
+    async def _save_medications(
         self,
+        db: AsyncSession,
         handoff_id: int,
         patient_id: int,
         agent_output: Dict[str, Any],
         now: datetime,
     ) -> None:
         meds: List[Dict[str, Any]] = agent_output.get("extracted", {}).get("medications", [])
-        for med in meds:
-            self._db.add(
-                models.MedicationHistory(
-                    handoff_id=handoff_id,
-                    patient_id=patient_id,
-                    med_name=med.get("name", "unknown"),
-                    dose=med.get("dose") or "not specified",
-                    time_given=None,  # raw string from LLM; skip parsing for now
-                    shift_date=now,
-                )
-            )
-
-    def _save_vitals(
+        await models.MedicationHistory.bulk_create(db, [
+            {
+                "handoff_id": handoff_id,
+                "patient_id": patient_id,
+                "med_name": med.get("name", "unknown"),
+                "dose": med.get("dose") or "not specified",
+                "time_given": None,  # raw string from LLM; skip parsing for now
+                "shift_date": now,
+            }
+            for med in meds
+        ])
+
+    async def _save_vitals(
         self,
+        db: AsyncSession,
         handoff_id: int,
         patient_id: int,
         agent_output: Dict[str, Any],
         now: datetime,
     ) -> None:
         vitals: List[Dict[str, Any]] = agent_output.get("extracted", {}).get("vitals", [])
-        for vital in vitals:
-            self._db.add(
-                models.VitalsHistory(
-                    handoff_id=handoff_id,
-                    patient_id=patient_id,
-                    vital_type=vital.get("type", "unknown"),
-                    value=str(vital.get("value", "")),
-                    trend=vital.get("trend"),
-                    recorded_at=now,
-                )
-            )
-
-    def _upsert_active_risks(
+        await models.VitalsHistory.bulk_create(db, [
+            {
+                "handoff_id": handoff_id,
+                "patient_id": patient_id,
+                "vital_type": vital.get("type", "unknown"),
+                "value": str(vital.get("value", "")),
+                "trend": vital.get("trend"),
+                "recorded_at": now,
+            }
+            for vital in vitals
+        ])
+
+    async def _upsert_active_risks(
         self,
+        db: AsyncSession,
         patient_id: int,
         agent_output: Dict[str, Any],
         now: datetime,
     ) -> None:
         """
-        Mark all previous active risks as resolved, then insert new ones from
-        this handoff so the frontend always sees the freshest risk snapshot.
+        Reconcile the patient's active risks with this handoff's alerts as a set
+        diff on (risk_type, severity): risks no longer flagged are resolved, new
+        ones inserted, unchanged ones left alone — so a steady patient writes nothing.
         """
-        self._db.query(models.ActiveRisk).filter(
-            models.ActiveRisk.patient_id == patient_id,
-            models.ActiveRisk.status == "active",
-        ).update({"status": "resolved", "resolved_at": now})
-
         alerts: List[Dict[str, Any]] = agent_output.get("risks", {}).get("alerts", [])
-        for alert in alerts:
-            self._db.add(
-                models.ActiveRisk(
-                    patient_id=patient_id,
-                    risk_type=alert.get("alert_type", "unknown"),
-                    severity=alert.get("severity", "LOW"),
-                    status="active",
-                    created_at=now,
-                )
+        new = {(a.get("alert_type", "unknown"), a.get("severity", "LOW")) for a in alerts}
+
+        current = (await db.execute(
+            select(models.ActiveRisk.id, models.ActiveRisk.risk_type, models.ActiveRisk.severity)
+            .where(
+                models.ActiveRisk.patient_id == patient_id,
+                models.ActiveRisk.status == "active",
             )
+        )).all()
+
+        to_resolve = [row.id for row in current if (row.risk_type, row.severity) not in new]
+        to_add = new - {(row.risk_type, row.severity) for row in current}
+
+        if to_resolve:
+            await db.execute(
+                update(models.ActiveRisk)
+                .where(models.ActiveRisk.id.in_(to_resolve))
+                .values(status="resolved", resolved_at=now)
+            )
+
+        await models.ActiveRisk.bulk_create(db, [
+            {
+                "patient_id": patient_id,
+                "risk_type": risk_type,
+                "severity": severity,
+                "status": "active",   # created_at comes from the server default
+            }
+            for risk_type, severity in sorted(to_add)
+        ])
 
     @staticmethod
     def _build_response(
-        handoff_id: int,
+        handoff: Row,
         patient_name: str,
         agent_output: Dict[str, Any],
     ) -> Dict[str, Any]:
-        alerts = agent_output.get("risks", {}).get("alerts", [])
-        top_alerts = [a.get("alert_type", "") for a in alerts[:5]]
-        narrative = agent_output.get("hinglish_summary", {}).get("patient_overview", "")
-
         return {
             "success": True,
-            "handoff_id": handoff_id,
+            "handoff_id": handoff.id,
             "patient_name": patient_name,
             "risk_level": agent_output.get("risks", {}).get("overall_risk", "LOW"),
-            "top_alerts": top_alerts,
-            "hinglish_narrative": narrative,
-            "full_analysis": agent_output,
+            "top_alerts": handoff.top_alerts or [],
+            "hinglish_narrative": handoff.narrative or "",
         }
+
+
+handoff_service = HandoffService()
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 import asyncio
+import importlib.util
 import logging
 import os
+import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, BinaryIO, Optional
 
 logger = logging.getLogger("backend.transcription_service")
 
@@ -12,6 +16,19 @@ STT_MODEL: str = os.getenv(
     "STT_MODEL", "mlx-community/whisper-large-v3-asr-fp16"
 )
 
+# Keep Whisper resident in this process when mlx_audio is importable here; loading
+# the weights is most of a transcription's cost, and the CLI subprocess (the
+# fallback) pays it again on every call
+_IN_PROCESS_STT: bool = importlib.util.find_spec("mlx_audio") is not None
+
+_COPY_CHUNK_BYTES = 1024 * 1024
+
+# ffmpeg reads streamable containers (webm, ogg, mp3, wav) straight from stdin, so
+# the upload skips a copy to disk. MP4/M4A put their index (moov atom) wherever the
+# encoder chose — often at the end — so the demuxer needs a seekable file.
+_FFMPEG_STDIN = "pipe:0"
+_SEEKABLE_INPUT_SUFFIXES = frozenset({".m4a", ".mp4"})
+
 _FFMPEG_WAV_ARGS = [
     "-ac", "1",
     "-ar", "16000",    
@@ -22,20 +39,39 @@ _FFMPEG_WAV_ARGS = [
 
 class TranscriptionService:
 
-    async def transcribe(self, audio_bytes: bytes, suffix: str = ".webm") -> str:
+    def __init__(self) -> None:
+        self._model: Optional[Any] = None
+        # One thread owns the model — every load and generate runs on it, so MLX
+        # is never driven from two threads and requests queue rather than contend
+        self._stt_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt")
+
+    async def warmup(self) -> None:
+        """Load the STT model ahead of the first upload (no-op on the subprocess fallback)."""
+        if not _IN_PROCESS_STT:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._stt_executor, self._load_model)
+        except Exception as exc:
+            logger.warning("STT warmup failed: %s", exc)
+
+    async def transcribe(self, audio_file: BinaryIO, suffix: str = ".webm") -> str:
         """
-        Accept raw audio bytes in any format, convert to WAV via ffmpeg,
-        then run the mlx_audio STT model and return the transcript.
+        Accept an audio file object in any format (e.g. UploadFile.file), convert
+        to WAV via ffmpeg, then run the mlx_audio STT model and return the transcript.
+        The upload is streamed in chunks — never held in memory as one bytes object.
         """
         with tempfile.TemporaryDirectory() as tmp_dir:
             tmp = Path(tmp_dir)
-            raw_path = tmp / f"input{suffix}"
             wav_path = tmp / "audio.wav"
             transcript_stem = tmp / "transcript"
 
-            raw_path.write_bytes(audio_bytes)
-
-            await self._convert_to_wav(str(raw_path), str(wav_path))
+            # The decode and the model load (if the startup warmup hasn't finished
+            # or failed) overlap instead of running back to back
+            await asyncio.gather(
+                self._to_wav(audio_file, suffix, tmp, wav_path),
+                self._prepare_stt(),
+            )
 
             return await self._run_stt(
                 audio_path=str(wav_path),
@@ -46,10 +82,49 @@ class TranscriptionService:
     # Private helpers
     # ──────────────────────────────────────────────────────────────────────
 
-    async def _convert_to_wav(self, input_path: str, output_path: str) -> None:
+    async def _to_wav(self, audio_file: BinaryIO, suffix: str, tmp: Path, wav_path: Path) -> None:
+        if suffix in _SEEKABLE_INPUT_SUFFIXES:
+            raw_path = tmp / f"input{suffix}"
+            await asyncio.to_thread(self._spool_to_disk, audio_file, raw_path)
+            await self._convert_to_wav(str(raw_path), str(wav_path))
+        else:
+            await self._convert_to_wav(_FFMPEG_STDIN, str(wav_path), feed=audio_file)
+
+    async def _prepare_stt(self) -> None:
+        if _IN_PROCESS_STT:
+            # Same thread as generate — a no-op once the model is resident
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._stt_executor, self._load_model)
+            except Exception as exc:
+                # Same contract as the subprocess path: STT failures surface as RuntimeError
+                logger.error("STT model load failed | model=%s | error=%r", STT_MODEL, exc)
+                raise RuntimeError(f"STT model load failed: {exc}") from exc
+
+    @staticmethod
+    def _spool_to_disk(audio_file: BinaryIO, path: Path) -> None:
+        audio_file.seek(0)
+        with path.open("wb") as out:
+            shutil.copyfileobj(audio_file, out, _COPY_CHUNK_BYTES)
+
+    @staticmethod
+    async def _pipe_to_stdin(audio_file: BinaryIO, stdin: asyncio.StreamWriter) -> None:
+        audio_file.seek(0)
+        try:
+            while chunk := await asyncio.to_thread(audio_file.read, _COPY_CHUNK_BYTES):
+                stdin.write(chunk)
+                await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # ffmpeg quit early (bad input) — its exit code and stderr say why
+        finally:
+            stdin.close()
+
+    async def _convert_to_wav(
+        self, input_path: str, output_path: str, feed: Optional[BinaryIO] = None
+    ) -> None:
         """
         Shell out to ffmpeg to convert any input audio format to a
         16 kHz, mono, PCM-s16le WAV file that Whisper requires.
+        With `feed`, the input is streamed to ffmpeg's stdin (input_path "pipe:0").
         """
         cmd = [
             "ffmpeg",
@@ -63,11 +138,21 @@ class TranscriptionService:
 
         proc = await asyncio.create_subprocess_exec(
             *cmd,
+            stdin=asyncio.subprocess.PIPE if feed is not None else asyncio.subprocess.DEVNULL,
             stdout=asyncio.subprocess.DEVNULL,
             stderr=asyncio.subprocess.PIPE,
         )
 
-        _, stderr = await proc.communicate()
+        if feed is not None:
+            # stderr is drained alongside the writes — a full stderr pipe would
+            # stall ffmpeg, and with it our stdin writes
+            _, stderr = await asyncio.gather(
+                self._pipe_to_stdin(feed, proc.stdin),
+                proc.stderr.read(),
+            )
+            await proc.wait()
+        else:
+            _, stderr = await proc.communicate()
 
         if proc.returncode != 0:
             err = stderr.decode(errors="replace")
@@ -76,7 +161,30 @@ class TranscriptionService:
 
         logger.info("ffmpeg conversion complete | output=%s", output_path)
 
+    def _load_model(self) -> Any:
+        if self._model is None:
+            from mlx_audio.stt.utils import load_model
+
+            logger.info("Loading STT model | model=%s", STT_MODEL)
+            self._model = load_model(STT_MODEL)
+        return self._model
+
+    def _generate(self, audio_path: str) -> str:
+        result = self._load_model().generate(audio_path, task="translate")
+        return result.text.strip()
+
     async def _run_stt(self, audio_path: str, output_stem: str) -> str:
+        if _IN_PROCESS_STT:
+            logger.info("Starting STT | model=%s | audio=%s", STT_MODEL, audio_path)
+            loop = asyncio.get_running_loop()
+            try:
+                transcript = await loop.run_in_executor(self._stt_executor, self._generate, audio_path)
+            except Exception as exc:
+                logger.error("STT failed | error=%r", exc)
+                raise RuntimeError(f"STT failed: {exc}") from exc
+            logger.info("STT finished")
+            return transcript
+
         cmd = [
             "python", "-m", "mlx_audio.stt.generate",
             "--model", STT_MODEL,
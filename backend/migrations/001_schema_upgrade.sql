@@ -0,0 +1,100 @@
+-- Brings a database created by the original models up to the current schema.
+-- create_all (DB_AUTO_CREATE=1) only creates missing tables — it never alters
+-- existing ones, so a database that predates these changes needs this script.
+--
+--   psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f backend/migrations/001_schema_upgrade.sql
+--
+-- One transaction: it either applies completely or not at all. The type changes
+-- and generated columns rewrite their tables under an exclusive lock, so run it
+-- in a quiet window. Safe to re-run.
+
+BEGIN;
+
+-- ── Timestamps → timestamptz ────────────────────────────────────────────────
+-- Existing naive values were written as UTC. Only columns still naive are
+-- converted, so a re-run leaves already-converted ones alone.
+DO $$
+DECLARE
+    col record;
+BEGIN
+    FOR col IN
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND data_type = 'timestamp without time zone'
+          AND (table_name, column_name) IN (
+              ('patients', 'created_at'),
+              ('handoffs', 'shift_time'),
+              ('handoffs', 'processed_at'),
+              ('medications_history', 'time_given'),
+              ('medications_history', 'shift_date'),
+              ('vitals_history', 'recorded_at'),
+              ('active_risks', 'created_at'),
+              ('active_risks', 'resolved_at')
+          )
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ALTER COLUMN %I TYPE timestamptz USING %I AT TIME ZONE ''UTC''',
+            col.table_name, col.column_name, col.column_name
+        );
+    END LOOP;
+END
+$$;
+
+-- Timestamps the database fills in (the ORM no longer sends them)
+ALTER TABLE patients     ALTER COLUMN created_at SET DEFAULT now();
+ALTER TABLE active_risks ALTER COLUMN created_at SET DEFAULT now();
+
+-- ── active_risks.status → native enum ───────────────────────────────────────
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'risk_status') THEN
+        CREATE TYPE risk_status AS ENUM ('active', 'resolved');
+    END IF;
+END
+$$;
+
+ALTER TABLE active_risks ALTER COLUMN status DROP DEFAULT;
+ALTER TABLE active_risks ALTER COLUMN status TYPE risk_status USING status::risk_status;
+
+-- ── users.email: unique constraint + hash lookup index ─────────────────────
+DROP INDEX IF EXISTS ix_users_email;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_users_email') THEN
+        ALTER TABLE users ADD CONSTRAINT uq_users_email UNIQUE (email);
+    END IF;
+END
+$$;
+CREATE INDEX IF NOT EXISTS ix_users_email_hash ON users USING hash (email);
+
+-- ── Handoffs: generated columns, storage, indexes ──────────────────────────
+ALTER TABLE handoffs
+    ADD COLUMN IF NOT EXISTS ctx_chief_complaint TEXT
+        GENERATED ALWAYS AS (agent_output_json -> 'extracted' -> 'summary' ->> 'chief_complaint') STORED,
+    ADD COLUMN IF NOT EXISTS ctx_overall_risk TEXT
+        GENERATED ALWAYS AS (agent_output_json -> 'risks' ->> 'overall_risk') STORED,
+    ADD COLUMN IF NOT EXISTS ctx_pending_tasks JSONB
+        GENERATED ALWAYS AS (agent_output_json -> 'extracted' -> 'pending_tasks') STORED,
+    ADD COLUMN IF NOT EXISTS ctx_medications JSONB
+        GENERATED ALWAYS AS (agent_output_json -> 'extracted' -> 'medications') STORED,
+    ADD COLUMN IF NOT EXISTS ctx_alerts JSONB
+        GENERATED ALWAYS AS (agent_output_json -> 'risks' -> 'alerts') STORED,
+    ADD COLUMN IF NOT EXISTS top_alerts JSONB
+        GENERATED ALWAYS AS (jsonb_path_query_array(agent_output_json, '$.risks.alerts[0 to 4].alert_type')) STORED,
+    ADD COLUMN IF NOT EXISTS narrative TEXT
+        GENERATED ALWAYS AS (agent_output_json -> 'hinglish_summary' ->> 'patient_overview') STORED;
+
+ALTER TABLE handoffs SET (toast_tuple_target = 256);
+
+CREATE INDEX IF NOT EXISTS ix_handoffs_agent_output_gin
+    ON handoffs USING gin (agent_output_json jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS ix_handoffs_patient_shift ON handoffs (patient_id, shift_time);
+
+-- ── History tables ─────────────────────────────────────────────────────────
+CREATE INDEX IF NOT EXISTS ix_meds_patient_shift ON medications_history (patient_id, shift_date);
+CREATE INDEX IF NOT EXISTS ix_vitals_patient_recorded ON vitals_history (patient_id, recorded_at);
+CREATE INDEX IF NOT EXISTS ix_risks_patient_active
+    ON active_risks (patient_id, created_at) WHERE status = 'active';
+
+COMMIT;
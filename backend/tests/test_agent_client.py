@@ -0,0 +1,53 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # backend/ — imports as app.*
+
+from app.services import AgentClient
+
+
+def _agent_output(degraded_layers: list[str]) -> dict:
+    return {
+        "risks": {"alerts": [], "overall_risk": "LOW", "risk_score": 0},
+        "processing_time_ms": 1234,
+        "degraded_layers": degraded_layers,
+    }
+
+
+class AgentClientCacheTest(unittest.TestCase):
+    def _calls_for_two_submissions(self, degraded_layers: list[str]) -> int:
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(200, json=_agent_output(degraded_layers))
+
+        async def run() -> None:
+            client = AgentClient()
+            await client.aclose()
+            client._client = httpx.AsyncClient(
+                base_url="http://agent", transport=httpx.MockTransport(handler)
+            )
+            try:
+                for _ in range(2):
+                    await client.call_extract("Bed 4, on heparin drip.", "07:00", "")
+            finally:
+                await client.aclose()
+
+        asyncio.run(run())
+        return calls
+
+    def test_complete_result_is_reused(self) -> None:
+        self.assertEqual(self._calls_for_two_submissions([]), 1)
+
+    def test_degraded_result_is_not_cached(self) -> None:
+        self.assertEqual(self._calls_for_two_submissions(["risk"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
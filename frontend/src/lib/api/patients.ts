@@ -84,7 +84,6 @@ export interface HandoffSummaryResponse {
     risk_level: string;
     top_alerts: string[];
     hinglish_narrative: string;
-    full_analysis: Record<string, unknown>;
 }
 
 // ──────────────────────────────────────────────────────